@@ -1,36 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, has_app_context, Response, stream_with_context
 import mysql.connector
+from db_pool import ConnectionPool, PoolTimeout
+from job_queue import JobQueue, MySQLJobStore, QueueFull
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from flask_bcrypt import Bcrypt
-import uuid
 import os
-import cv2
-import numpy as np
-import math
-from ultralytics import YOLO
-import easyocr
 import io
+import csv
+import json
+from datetime import datetime
 from flask import send_from_directory
+from evidence_store import EVIDENCE_DIR, THUMBNAIL_DIR, content_hash
+from inference_client import detect_images, get_ocr_cache_stats, InferenceUnavailable
+from violation_store import record_auto_violation, record_device_violations, record_violation_group, violation_record, DEADLOCK
+from violation_buffer import create_buffer, BufferFull, FlushFailed
+from vehicle_registry import registry as vehicle_registry
+import read_cache
+from read_cache import vehicle_key, violations_key, violation_key, profile_key
+from listing import (keyset_page, like_escape, json_value, parse_violation_filters, ListingError, VEHICLE_COLUMNS, VIOLATION_COLUMNS, VIOLATIONS_FROM,
+                     EXPORT_COLUMNS, query_plate_violations, group_plate_violations, query_export)
+import dashboard_stats
+import metrics
 
 # initialize flask app
 app = Flask(__name__)
+# request count / latency per route and GET /metrics
+metrics.instrument_app(app)
 app.config['JWT_SECRET_KEY'] = 'secretig'  
 jwt = JWTManager(app)
 bcrypt = Bcrypt(app)
 
 
-print("Loading ML models and EasyOCR...")
-try:
-    helmet_model = YOLO("Weights/best.pt")
-    helmet_classNames = ['With Helmet', 'Without Helmet']
-    plate_model = YOLO("Weights/license_plate_detector.pt") 
-    reader = easyocr.Reader(['en'])
-    print("Models and EasyOCR loaded successfully.")
-except Exception as e:
-    print(f"ERROR: Could not load models or EasyOCR. {e}")
-
-
 CORS(app, resources={
     r"/*": {
         "origins": "http://localhost:3000",
@@ -39,19 +40,73 @@ CORS(app, resources={
     }
 }) 
 
-# function to create a new database connection
+# API_WORKERS=0 is the debug server with the reloader, for development
+# API_WORKERS=N serves with N pre-forked worker processes (see prefork.py), for production
+API_WORKERS = int(os.environ.get("API_WORKERS", 0))
+
+# shared connection pool, opened lazily so the app can start without MySQL
+db_pool = ConnectionPool()
+
+# function to get a database connection from the pool
+# the connection is handed back automatically when the request ends, so error paths cant leak it
 def get_db_connection():
     try:
-        db = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            passwd="root",
-            database="TrafficDB"
-        )
-        return db
-    except mysql.connector.Error as e:
+        db = db_pool.get_connection()
+    except (mysql.connector.Error, PoolTimeout) as e:
         print("Error connecting to MySQL:", e)
         return None
+    if has_app_context():
+        g.setdefault('db_connections', []).append(db)
+    return db
+
+
+@app.teardown_appcontext
+def return_db_connections(exception=None):
+    for db in g.pop('db_connections', []):
+        db.close()
+
+
+metrics.Gauge("db_pool_connections", "Pool connections by state", lambda: {
+    (state,): value for state, value in db_pool.get_stats().items() if state in ("open", "idle", "in_use")}, labels=("state",))
+
+
+# write-behind buffer for violation inserts, None unless VIOLATION_WRITE_MODE=buffered
+violation_buffer = create_buffer(db_pool)
+if violation_buffer is not None:
+    metrics.Gauge("violation_buffer_depth", "Violations waiting in the write-behind buffer", violation_buffer.depth)
+VIOLATION_BUFFER_RETRY_AFTER = int(os.environ.get("VIOLATION_BUFFER_RETRY_AFTER", 1))
+
+
+def buffer_full_response(e):
+    response = jsonify({"error": f"{str(e)}, try again later."})
+    response.headers['Retry-After'] = str(VIOLATION_BUFFER_RETRY_AFTER)
+    return response, 503
+
+
+# buffer depth, group sizes and flush latency of the write-behind buffer
+@app.route('/violation-buffer-stats', methods=['GET'])
+def violation_buffer_stats():
+    if violation_buffer is None:
+        return jsonify({"mode": "direct"}), 200
+    return jsonify({"mode": "buffered", **violation_buffer.get_stats()}), 200
+
+
+# pool stats for operators
+@app.route('/db-pool-stats', methods=['GET'])
+def db_pool_stats():
+    return jsonify(db_pool.get_stats()), 200
+
+
+# plate -> VehicleID cache used by auto-registration
+@app.route('/vehicle-cache-stats', methods=['GET'])
+def vehicle_cache_stats():
+    return jsonify(vehicle_registry.get_stats()), 200
+
+
+# hit ratio per key type of the read-through cache, to size READ_CACHE_SIZE / READ_CACHE_TTL
+@app.route('/read-cache-stats', methods=['GET'])
+def read_cache_stats():
+    return jsonify(read_cache.cache.get_stats()), 200
 
 
 # testing database connection
@@ -176,83 +231,24 @@ def _build_cors_preflight_response():
 
 
 
-#model stuff
-def detect_violation_and_plate(img):
-
-    violation_found = False
-    violation_type_found = ""
-    plate_text_clean = None
-    annotated_img = img.copy()
-    
-    # Run HelmetDetection
-    helmet_results = helmet_model(img)
-
-    for r in helmet_results:
-        boxes = r.boxes
-        for box in boxes:
-            cls = int(box.cls[0])
-            class_name = helmet_classNames[cls]
-
-            if class_name == 'Without Helmet':
-                violation_found = True
-                violation_type_found = class_name
-                #Draw the -Without Helmet box
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cv2.rectangle(annotated_img, (x1, y1), (x2, y2), (0, 0, 255), 2) # Red box
-                cv2.putText(annotated_img, f'{class_name}', (x1, y1 - 10),cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                break
-        if violation_found:
-            break
-    
-    # If a violation was found, find the license plate
-    if violation_found:
-        print("Violation detected! Searching for license plate...")
-        
-        plate_results = plate_model(img, conf=0.1) 
-        
-        for r_plate in plate_results:
-            boxes_plate = r_plate.boxes
-            if len(boxes_plate) > 0:
-                best_plate_box = boxes_plate[0] 
-                px1, py1, px2, py2 = map(int, best_plate_box.xyxy[0])
-                
-                # Crop the image
-                padding = 5
-                py1, py2 = max(0, py1 - padding), min(img.shape[0], py2 + padding)
-                px1, px2 = max(0, px1 - padding), min(img.shape[1], px2 + padding)
-                
-                plate_crop = img[py1:py2, px1:px2]
-
-                try:
-                    # Run OCR
-                    ocr_result = reader.readtext(plate_crop)
-                    if ocr_result:
-                        plate_text = ocr_result[0][1]
-                        plate_text_clean = "".join(filter(str.isalnum, plate_text)).upper()
-                        print(f"Plate found: {plate_text_clean}")
-                        #Draw "License Plate" box 
-                        cv2.rectangle(annotated_img, (px1, py1), (px2, py2), (0, 255, 0), 2) # Green box
-                        cv2.putText(annotated_img, f'{plate_text_clean}', (px1, py1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                        break 
-                except Exception as e:
-                    print(f"Error during OCR: {e}")
-            
-        if not plate_text_clean:
-            print("Violation found, but no license plate was read.")
-    else:
-        print("No violations found in this image.")
-
-    return violation_type_found, plate_text_clean, annotated_img
-
-
-
-
+#store evidence
+# evidence files never change once written (content addressed, or a unique legacy uuid name),
+# so browsers and proxies may keep them for a year without asking again.
+# send_from_directory answers Range and If-None-Match / If-Modified-Since requests itself.
+EVIDENCE_MAX_AGE = int(os.environ.get("EVIDENCE_MAX_AGE", 365 * 24 * 3600))
 
 
-#store evidence
 @app.route('/evidence/<path:filename>')
 def serve_evidence_image(filename):
-    return send_from_directory('evidence_uploads', filename)
+    # content addressed names carry their hash, use it as a strong ETag
+    # (a thumbnail is named after the full image, so its tag gets a suffix)
+    is_thumbnail = filename.startswith(THUMBNAIL_DIR + "/")
+    digest = content_hash(filename[len(THUMBNAIL_DIR) + 1:] if is_thumbnail else filename)
+    etag = (digest + "-thumb" if is_thumbnail else digest) if digest else True
+    response = send_from_directory(EVIDENCE_DIR, filename, conditional=True, max_age=EVIDENCE_MAX_AGE, etag=etag)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 
@@ -262,6 +258,10 @@ def serve_evidence_image(filename):
 @app.route('/dashboard-stats', methods=['GET'])
 @jwt_required()
 def get_dashboard_stats():
+    stats = dashboard_stats.cached_stats()
+    if stats:
+        return jsonify(stats), 200
+
     try:
         db = get_db_connection()
         if not db:
@@ -269,46 +269,14 @@ def get_dashboard_stats():
         
         cursor = db.cursor()
 
-        #Total Vehicles
-        cursor.execute("SELECT COUNT(*) FROM Vehicle")
-        total_vehicles = cursor.fetchone()[0]
-
-        #Total Violations
-        cursor.execute("SELECT COUNT(*) FROM Violations")
-        total_violations = cursor.fetchone()[0]
-
-        #Total Fines Paid
-        cursor.execute("SELECT SUM(FineAmount) FROM Violations WHERE Status = 'Paid'")
-        total_paid_result = cursor.fetchone()[0]
-        total_paid = float(total_paid_result or 0) # Handle None if no paid fines
-
-        #Total Fines Unpaid
-        cursor.execute("SELECT SUM(FineAmount) FROM Violations WHERE Status = 'Unpaid'")
-        total_unpaid_result = cursor.fetchone()[0]
-        total_unpaid = float(total_unpaid_result or 0)
-
-        #Most Common Violation
-        cursor.execute("""
-            SELECT ViolationType, COUNT(*) as count 
-            FROM Violations 
-            GROUP BY ViolationType 
-            ORDER BY count DESC 
-            LIMIT 1
-        """)
-        top_violation_result = cursor.fetchone()
-        top_violation = top_violation_result[0] if top_violation_result else "N/A"
+        #all five numbers come from the summary tables, see dashboard_stats.py
+        stats = dashboard_stats.load_stats(cursor)
 
         cursor.close()
         db.close()
 
         #Return all stats as a single JSON object
-        return jsonify({
-            "total_vehicles": total_vehicles,
-            "total_violations": total_violations,
-            "total_paid": total_paid,
-            "total_unpaid": total_unpaid,
-            "top_violation": top_violation
-        }), 200
+        return jsonify(stats), 200
 
     except Exception as e:
         print(f"Error in /dashboard-stats: {str(e)}")
@@ -332,12 +300,12 @@ def get_dashboard_stats():
 def get_my_profile_stats():
     # Get the username from the currently loggedin user
     current_user_username = get_jwt_identity()
-    
-    try:
+
+    def load():
         db = get_db_connection()
         if not db:
-            return jsonify({"error": "Database connection failed"}), 500
-        
+            return {"error": "Database connection failed"}, 500
+
         cursor = db.cursor()
 
         #Get user role
@@ -356,18 +324,18 @@ def get_my_profile_stats():
         cursor.close()
         db.close()
 
-        return jsonify({
+        return {
             "username": current_user_username,
             "role": user_role,
             "violations_reported": violations_reported,
             "vehicles_registered": vehicles_registered
-        }), 200
+        }, 200
 
+    try:
+        body, status = read_cache.cache.response(profile_key(current_user_username), load)
+        return jsonify(body), status
     except Exception as e:
         print(f"Error in /my-profile-stats: {str(e)}")
-        if 'db' in locals() and db.is_connected():
-            cursor.close()
-            db.close()
         return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
 
 
@@ -395,7 +363,9 @@ def register_vehicle():
 
         cursor = db.cursor()
         cursor.execute(query, values)
+        dashboard_stats.record_vehicle_added(cursor)
         db.commit()
+        read_cache.cache.invalidate(vehicle_key(data['LicensePlate']), violations_key(data['LicensePlate']))
         cursor.close()
         db.close()
         return jsonify({"message": "Vehicle registered successfully!"}), 201
@@ -418,9 +388,21 @@ def delete_vehicle(license_plate):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Delete vehicle from the database
-    cursor.execute("DELETE FROM Vehicle WHERE LicensePlate = %s", (license_plate,))
+    # Delete vehicle from the database, the dashboard counters lose it and its violations
+    cursor.execute("SELECT VehicleID, RegisteredBy FROM Vehicle WHERE LicensePlate = %s FOR UPDATE", (license_plate,))
+    vehicle = cursor.fetchone()
+    stale_keys = [vehicle_key(license_plate), violations_key(license_plate)]
+    if vehicle:
+        # its violations go too (ON DELETE CASCADE), and with them the reporters profile counts
+        cursor.execute("SELECT ViolationID, ReportedBy FROM Violations WHERE VehicleID = %s", (vehicle[0],))
+        for violation_id, reported_by in cursor.fetchall():
+            stale_keys += [violation_key(violation_id), profile_key(reported_by)]
+        stale_keys.append(profile_key(vehicle[1]))
+        dashboard_stats.record_vehicle_deleted(cursor, vehicle[0])
+        cursor.execute("DELETE FROM Vehicle WHERE VehicleID = %s", (vehicle[0],))
     conn.commit()
+    vehicle_registry.forget(license_plate)
+    read_cache.cache.invalidate(*set(stale_keys))
 
     cursor.close()
     conn.close()
@@ -429,6 +411,12 @@ def delete_vehicle(license_plate):
 
 
 # get all vehicles API
+# without query parameters this still returns the full list (old behaviour),
+# with any of limit / cursor / fields / count or a filter it returns one keyset page:
+#   ?plate=KA01          plate prefix
+#   ?owner=kumar         owner name contains
+#   ?type=Motorcycle     exact VehicleType
+#   ?registered_by=bob   exact RegisteredBy
 @app.route('/get-vehicles', methods=['GET'])
 @jwt_required()
 def get_vehicles():
@@ -438,6 +426,23 @@ def get_vehicles():
             return jsonify({"error": "Database connection failed"}), 500
 
         cursor = db.cursor()
+
+        if request.args:
+            filters = []
+            if request.args.get('plate'):
+                filters.append(("LicensePlate LIKE %s", [like_escape(request.args['plate']) + "%"]))
+            if request.args.get('owner'):
+                filters.append(("OwnerName LIKE %s", ["%" + like_escape(request.args['owner']) + "%"]))
+            if request.args.get('type'):
+                filters.append(("VehicleType = %s", [request.args['type']]))
+            if request.args.get('registered_by'):
+                filters.append(("RegisteredBy = %s", [request.args['registered_by']]))
+
+            page = keyset_page(cursor, request.args, "Vehicle", VEHICLE_COLUMNS, "VehicleID", filters)
+            cursor.close()
+            db.close()
+            return jsonify(page), 200
+
         cursor.execute("SELECT * FROM Vehicle")
         vehicles = cursor.fetchall()
         vehicle_list = [{
@@ -451,6 +456,38 @@ def get_vehicles():
         cursor.close()
         db.close()
         return jsonify(vehicle_list), 200
+    except ListingError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# list violations one keyset page at a time, same paging parameters as /get-vehicles plus
+#   ?plate=KA01AB1234   ?status=Unpaid   ?type=Speeding   ?reported_by=bob
+#   ?from=2024-01-01    ?to=2024-02-01   (DateTime range, to is exclusive)
+@app.route('/violations', methods=['GET'])
+@jwt_required()
+def list_violations():
+    try:
+        filters = parse_violation_filters(request.args)
+        if request.args.get('plate'):
+            filters.append(("ve.LicensePlate = %s", [request.args['plate']]))
+        if request.args.get('type'):
+            filters.append(("v.ViolationType = %s", [request.args['type']]))
+        if request.args.get('reported_by'):
+            filters.append(("v.ReportedBy = %s", [request.args['reported_by']]))
+
+        db = get_db_connection()
+        if not db:
+            return jsonify({"error": "Database connection failed"}), 500
+
+        cursor = db.cursor()
+        page = keyset_page(cursor, request.args, VIOLATIONS_FROM, VIOLATION_COLUMNS, "ViolationID", filters)
+        cursor.close()
+        db.close()
+        return jsonify(page), 200
+    except ListingError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -459,10 +496,10 @@ def get_vehicles():
 @app.route('/get-vehicle/<license_plate>', methods=['GET'])
 def get_vehicle(license_plate):
 
-    try:
+    def load():
         db = get_db_connection()
         if not db:
-            return jsonify({"error": "Database connection failed"}), 500
+            return {"error": "Database connection failed"}, 500
 
         cursor = db.cursor()
         cursor.execute("SELECT * FROM Vehicle WHERE LicensePlate = %s", (license_plate,))
@@ -471,7 +508,7 @@ def get_vehicle(license_plate):
         if not vehicle:
             cursor.close()
             db.close()
-            return jsonify({"error": "Vehicle not found"}), 404
+            return {"error": "Vehicle not found"}, 404
 
         vehicle_data = {
             "VehicleID": vehicle[0],
@@ -483,7 +520,11 @@ def get_vehicle(license_plate):
         }
         cursor.close()
         db.close()
-        return jsonify(vehicle_data), 200
+        return vehicle_data, 200
+
+    try:
+        body, status = read_cache.cache.response(vehicle_key(license_plate), load)
+        return jsonify(body), status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -518,7 +559,9 @@ def add_violation():
         query = "INSERT INTO Violations (VehicleID, ViolationType, FineAmount, Location) VALUES (%s, %s, %s, %s)"
         values = (vehicle_id, data['ViolationType'], data['FineAmount'], data['Location'])
         cursor.execute(query, values)
+        dashboard_stats.record_violation_added(cursor, data['ViolationType'], data['FineAmount'])
         db.commit()
+        read_cache.violations_added([(data['LicensePlate'], None)])
         cursor.close()
         db.close()
         return jsonify({"message": "Violation recorded successfully!"}), 201
@@ -533,6 +576,79 @@ def add_violation():
 
 #auto detection stuff
 
+AUTODETECT_MAX_BATCH = int(os.environ.get("AUTODETECT_MAX_BATCH", 32))
+# tries for a batch write (/autodetect/batch, /iot/report-speeding/batch) that lost a deadlock or a duplicate key race
+BATCH_WRITE_ATTEMPTS = 3
+
+
+# plate OCR cache counters, served by the inference service
+@app.route('/ocr-cache-stats', methods=['GET'])
+def ocr_cache_stats():
+    try:
+        return jsonify(get_ocr_cache_stats()), 200
+    except InferenceUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+
+# full autodetect flow for one uploaded image, shared by /autodetect and the job workers
+# returns the response body, http status and extra response headers
+def autodetect_image(contents, filename):
+    db = None
+    try:
+        #Runing the ML detection FIRST, the inference service also saves the annotated evidence image
+        result = detect_images([(filename, contents)])[0]
+        violations = result.get("violations", [])
+
+        #Handle detection results
+        if result["status"] == "invalid_image":
+            return {"error": "Invalid image file"}, 400, {}
+
+        if result["status"] == "no_violation":
+            return {"message": "No violation was detected."}, 200, {}
+        
+        if result["status"] == "plate_unreadable":
+            return {"message": f"Violation ({result['violation_type']}) detected, but the license plate was unreadable."}, 200, {}
+
+        unique_filename = result["evidence_image"]
+
+        #Save to Database
+        if violation_buffer is not None:
+            violation_buffer.add([violation_record(v["violation_type"], v["license_plate"], unique_filename) for v in violations])
+        else:
+            db = get_db_connection()
+            if not db:
+                return {"error": "Database connection failed"}, 500, {}
+
+            cursor = db.cursor()
+            for violation in violations:
+                record_auto_violation(cursor, violation["violation_type"], violation["license_plate"], unique_filename)
+            db.commit()
+            cursor.close()
+            read_cache.violations_added([(v["license_plate"], None) for v in violations])
+        
+        return {
+            "message": "Success! Violation added." if len(violations) == 1 else f"Success! {len(violations)} violations added.",
+            "violation_type": violations[0]["violation_type"],
+            "license_plate": violations[0]["license_plate"],
+            "violations": violations
+        }, 201, {}
+
+    except InferenceUnavailable as e:
+        print(f"Error in /autodetect: {str(e)}")
+        return {"error": "Detection service is unavailable, try again later."}, 503, {}
+    except BufferFull as e:
+        return {"error": f"{str(e)}, try again later."}, 503, {"Retry-After": str(VIOLATION_BUFFER_RETRY_AFTER)}
+    except Exception as e:
+        print(f"Error in /autodetect: {str(e)}")
+        if db and db.is_connected():
+            db.rollback()
+        return {"error": f"An internal server error occurred: {str(e)}"}, 500, {}
+    finally:
+        # job workers run outside a request, so nothing else would return the connection
+        if db:
+            db.close()
+
+
 @app.route('/autodetect', methods=['POST'])
 @jwt_required()
 def autodetect_violation():
@@ -544,99 +660,159 @@ def autodetect_violation():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    try:
-        #Read the image file in memory
-        contents = file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    body, status, headers = autodetect_image(file.read(), file.filename)
+    return jsonify(body), status, headers
 
-        if img is None:
-            return jsonify({"error": "Invalid image file"}), 400
-        
-        #Runing the ML detection function FIRST to get the annotated image
-        violation_type, plate_number, annotated_img = detect_violation_and_plate(img)
 
-        #Handle detection results
-        if not violation_type:
-            return jsonify({"message": "No violation was detected."}), 200
-        
-        if not plate_number:
-            return jsonify({"message": f"Violation ({violation_type}) detected, but the license plate was unreadable."}), 200
+# async autodetect: the upload is queued and handled by a small pool of inference workers
+AUTODETECT_WORKERS = int(os.environ.get("AUTODETECT_WORKERS", 2))
+AUTODETECT_QUEUE_DEPTH = int(os.environ.get("AUTODETECT_QUEUE_DEPTH", 50))
+AUTODETECT_RETRY_AFTER = int(os.environ.get("AUTODETECT_RETRY_AFTER", 5))
+# where job status / results live: memory (this process) or mysql (AutodetectJobs table).
+# with several API workers a poll can land on any of them, so the default there is mysql
+AUTODETECT_JOB_STORE = os.environ.get("AUTODETECT_JOB_STORE", "mysql" if API_WORKERS > 1 else "memory")
 
-        #SAVE the fule
-        file_extension = os.path.splitext(file.filename)[1]
-        if not file_extension: # Default to .jpg
-            file_extension = ".jpg"
-            
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        save_path = os.path.join("evidence_uploads", unique_filename)
-        
-        # Save the image
-        success, encoded_image = cv2.imencode(file_extension, annotated_img)
-        if success:
-            with open(save_path, "wb") as f:
-                f.write(encoded_image)
-            print(f"Evidence file saved to: {save_path}")
 
-        #Save to Database
-        db = get_db_connection()
-        if not db:
-            return jsonify({"error": "Database connection failed"}), 500
-        
-        cursor = db.cursor()
+def run_autodetect_job(contents, filename):
+    body, status, _ = autodetect_image(contents, filename)
+    return {"http_status": status, **body}
 
-        #Get vehicle ID from license plate
-        cursor.execute("SELECT VehicleID FROM Vehicle WHERE LicensePlate = %s", (plate_number,))
-        vehicle = cursor.fetchone()
 
-        if not vehicle:
-            #auto regis vehicle
-            print(f"Vehicle {plate_number} not found. Auto-registering...")
-            
-            #Get the count
-            cursor.execute("SELECT COUNT(*) FROM Vehicle WHERE OwnerName LIKE 'UNKNOWN (%)'")
-            count_result = cursor.fetchone()
-            unknown_count = count_result[0]
-            
-            #Create the new unique owner name
-            new_owner_name = f"UNKNOWN ({unknown_count + 1}) (Auto-Detected)"
+if AUTODETECT_JOB_STORE not in ("memory", "mysql"):
+    raise ValueError(f"Unknown AUTODETECT_JOB_STORE: {AUTODETECT_JOB_STORE} (expected memory or mysql)")
+autodetect_jobs = JobQueue(run_autodetect_job, workers=AUTODETECT_WORKERS, max_depth=AUTODETECT_QUEUE_DEPTH, name="autodetect",
+                           store=MySQLJobStore(db_pool) if AUTODETECT_JOB_STORE == "mysql" else None)
+metrics.Gauge("autodetect_queue_depth", "Autodetect jobs waiting for a worker", autodetect_jobs.depth)
 
-            #Define the query
-            register_query = """INSERT INTO Vehicle(OwnerName, LicensePlate, VehicleType, Contact, Address) VALUES (%s, %s, %s, %s, %s)"""
-            
-            #Use the 'new_owner_name' variable
-            placeholder_values = (new_owner_name, plate_number, "Motorcycle", "N/A", "N/A")
-            cursor.execute(register_query, placeholder_values)
-            db.commit()
-            vehicle_id = cursor.lastrowid
-            print(f"New vehicle registered with ID: {vehicle_id} and Owner: {new_owner_name}")
-        else:
-            vehicle_id = vehicle[0]
 
-        default_fine = 500  # Set a default fine for 'No Helmet'
-        default_location = "Auto-Detected via Camera"
+@app.route('/autodetect/jobs', methods=['POST'])
+@jwt_required()
+def submit_autodetect_job():
+    if 'image_file' not in request.files:
+        return jsonify({"error": "No image file provided"}), 400
 
-        # Insert violation
-        query = "INSERT INTO Violations (VehicleID, ViolationType, FineAmount, Location, evidence_image) VALUES (%s, %s, %s, %s, %s)"
-        values = (vehicle_id, violation_type, default_fine, default_location, unique_filename)
-        cursor.execute(query, values)
-        db.commit()
-        
-        cursor.close()
-        db.close()
-        
-        return jsonify({
-            "message": "Success! Violation added.",
-            "violation_type": violation_type,
-            "license_plate": plate_number
-        }), 201
+    file = request.files['image_file']
+
+    if file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+
+    try:
+        job_id = autodetect_jobs.submit(file.read(), file.filename)
+    except QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(AUTODETECT_RETRY_AFTER)
+        return response, 503
+    except (mysql.connector.Error, PoolTimeout) as e:
+        print(f"Error in /autodetect/jobs: {str(e)}")
+        return jsonify({"error": "Could not store the job, try again later."}), 503
+
+    response = jsonify({"job_id": job_id, "status": "queued"})
+    response.headers["Location"] = f"/autodetect/jobs/{job_id}"
+    return response, 202
+
+
+@app.route('/autodetect/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_autodetect_job(job_id):
+    try:
+        job = autodetect_jobs.get(job_id)
+    except (mysql.connector.Error, PoolTimeout) as e:
+        print(f"Error in /autodetect/jobs/{job_id}: {str(e)}")
+        return jsonify({"error": "Could not read the job, try again later."}), 503
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+# batch version of /autodetect for cameras that upload in bursts
+# send many files under 'image_files', results come back per image in upload order
+@app.route('/autodetect/batch', methods=['POST'])
+@jwt_required()
+def autodetect_violation_batch():
+    files = [f for f in request.files.getlist('image_files') if f.filename != '']
+
+    if not files:
+        return jsonify({"error": "No image files provided"}), 400
+
+    if len(files) > AUTODETECT_MAX_BATCH:
+        return jsonify({"error": f"Too many images, the limit is {AUTODETECT_MAX_BATCH} per batch"}), 413
+
+    try:
+        #Runing the ML detection for the whole batch in one call to the inference service
+        results = detect_images([(f.filename, f.read()) for f in files])
+        to_record = [i for i, r in enumerate(results) if r["status"] == "violation_found"]
+
+        failed = {}
+
+        #Save every violation in one transaction
+        if to_record and violation_buffer is not None:
+            recorded = [(i, v) for i in to_record for v in results[i]["violations"]]
+            try:
+                violation_buffer.add([violation_record(v["violation_type"], v["license_plate"], results[i]["evidence_image"])
+                                      for i, v in recorded])
+            except FlushFailed as e:
+                # the rest of the batch is committed, say per violation which ones are not
+                print(f"Error in /autodetect/batch: {str(e)}")
+                failed = e.failed
+            for position, (i, v) in enumerate(recorded):
+                v["recorded"] = position not in failed
+                if position in failed:
+                    v["error"] = failed[position]
+                    results[i]["status"] = "violation_failed"
+            for i in to_record:
+                if results[i]["status"] != "violation_failed":
+                    results[i]["status"] = "violation_recorded"
+        elif to_record:
+            db = get_db_connection()
+            if not db:
+                return jsonify({"error": "Database connection failed"}), 500
+
+            records = [violation_record(v["violation_type"], v["license_plate"], results[i]["evidence_image"])
+                       for i in to_record for v in results[i]["violations"]]
+            cursor = db.cursor()
+            # one group write (new plates registered in plate order), run again if it lost a deadlock
+            # against a concurrent batch or a cached vehicle was deleted in the meantime
+            for attempt in range(BATCH_WRITE_ATTEMPTS):
+                try:
+                    record_violation_group(cursor, records)
+                    db.commit()
+                    break
+                except mysql.connector.Error as e:
+                    db.rollback()
+                    if attempt == BATCH_WRITE_ATTEMPTS - 1:
+                        raise
+                    if isinstance(e, mysql.connector.IntegrityError):
+                        for record in records:
+                            vehicle_registry.forget(record["plate"])
+                    elif e.errno != DEADLOCK:
+                        raise
+            read_cache.violations_added([(v["license_plate"], None) for i in to_record for v in results[i]["violations"]])
 
-    except Exception as e:
-        print(f"Error in /autodetect: {str(e)}")
-        if 'db' in locals() and db.is_connected():
-            db.rollback()
             cursor.close()
             db.close()
+
+            for i in to_record:
+                results[i]["status"] = "violation_recorded"
+
+        total = sum(len(results[i]["violations"]) for i in to_record)
+        if failed and len(failed) == total:
+            status = 500
+        else:
+            status = 201 if to_record else 200
+        return jsonify({
+            "violations_recorded": total - len(failed),
+            "violations_failed": len(failed),
+            "results": results
+        }), status
+
+    except InferenceUnavailable as e:
+        print(f"Error in /autodetect/batch: {str(e)}")
+        return jsonify({"error": "Detection service is unavailable, try again later."}), 503
+    except BufferFull as e:
+        return buffer_full_response(e)
+    except Exception as e:
+        # the connection (if one was taken) goes back to the pool at teardown, which rolls back an open transaction
+        print(f"Error in /autodetect/batch: {str(e)}")
         return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
 
 
@@ -648,11 +824,23 @@ def autodetect_violation():
 #
 #iot radar gun
 #
+IOT_API_KEY = 'my-secret-iot-key'
+IOT_DEFAULT_DEVICE = "IoT-Radar-01"
+IOT_LOCATION = "Simulated Radar (NH-48)"
+IOT_MAX_BATCH = int(os.environ.get("IOT_MAX_BATCH", 500))
+
+
+def speeding_fine(speed):
+    fine_amount = (speed - 90) * 10  
+    if fine_amount < 100: fine_amount = 100
+    return fine_amount
+
+
 @app.route('/iot/report-speeding', methods=['POST'])
 def iot_report_speeding():
     #Check for the secret API Key 
     api_key = request.headers.get('X-API-Key')
-    if api_key != 'my-secret-iot-key':
+    if api_key != IOT_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
 
     #Get the data from the IoT device
@@ -663,43 +851,26 @@ def iot_report_speeding():
     if not plate_number or not speed:
         return jsonify({"error": "Missing LicensePlate or Speed"}), 400
 
+    #calc and log fine and violation, unknown plates are auto registered in the same transaction
+    fine_amount = speeding_fine(speed)
+    if violation_buffer is not None:
+        try:
+            violation_buffer.add([violation_record("Speeding", plate_number, location=IOT_LOCATION, fine_amount=fine_amount,
+                                                   vehicle_type="UNKNOWN", reported_by=IOT_DEFAULT_DEVICE)])
+        except BufferFull as e:
+            return buffer_full_response(e)
+        except FlushFailed as e:
+            print(f"Error in /iot/report-speeding: {str(e)}")
+            return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
+        return jsonify({"message": f"Successfully logged speeding violation for {plate_number}"}), 201
+
     try:
-        #same auto regis logic
         db = get_db_connection()
         cursor = db.cursor()
-
-        cursor.execute("SELECT VehicleID FROM Vehicle WHERE LicensePlate = %s", (plate_number,))
-        vehicle = cursor.fetchone()
-        vehicle_id = None
-
-        if not vehicle:
-            print(f"[IoT] Vehicle {plate_number} not found. Auto-registering...")
-            cursor.execute("SELECT COUNT(*) FROM Vehicle WHERE OwnerName LIKE 'UNKNOWN (%)'")
-            count_result = cursor.fetchone()
-            unknown_count = count_result[0]
-            new_owner_name = f"UNKNOWN ({unknown_count + 1}) (Auto-Detected)"
-
-            register_query = """INSERT INTO Vehicle(OwnerName, LicensePlate, VehicleType, Contact, Address) VALUES (%s, %s, %s, %s, %s)"""
-            placeholder_values = (new_owner_name, plate_number, "UNKNOWN", "N/A", "N/A")
-            
-            cursor.execute(register_query, placeholder_values)
-            db.commit()
-            vehicle_id = cursor.lastrowid
-        else:
-            vehicle_id = vehicle[0]
-
-        #calc and log fine and violation
-        fine_amount = (speed - 90) * 10  
-        if fine_amount < 100: fine_amount = 100
-
-        query = """
-            INSERT INTO Violations (VehicleID, ViolationType, FineAmount, Location, ReportedBy) 
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        values = (vehicle_id, "Speeding", fine_amount, "Simulated Radar (NH-48)", "IoT-Radar-01")
-        
-        cursor.execute(query, values)
+        record_auto_violation(cursor, "Speeding", plate_number, location=IOT_LOCATION,
+                              fine_amount=fine_amount, vehicle_type="UNKNOWN", reported_by=IOT_DEFAULT_DEVICE)
         db.commit()
+        read_cache.violations_added([(plate_number, IOT_DEFAULT_DEVICE)])
         
         cursor.close()
         db.close()
@@ -715,6 +886,119 @@ def iot_report_speeding():
         return jsonify({"error": f"An internal server error occurred: {str(e)}"}), 500
 
 
+# reading time sent by the device: unix seconds or ISO 8601, stored as server local time like DateTime
+def parse_reading_time(value):
+    if isinstance(value, bool):
+        raise ValueError("bad timestamp")
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def parse_reading(reading):
+    if not isinstance(reading, dict):
+        raise ValueError("Reading must be an object")
+    key = reading.get('IdempotencyKey')
+    plate_number = reading.get('LicensePlate')
+    speed = reading.get('Speed')
+    if not key or not plate_number or not speed or 'Timestamp' not in reading:
+        raise ValueError("Missing IdempotencyKey, LicensePlate, Speed or Timestamp")
+    if not isinstance(key, str) or len(key) > 64 or not key.isascii():
+        raise ValueError("IdempotencyKey must be an ASCII string of at most 64 characters")
+    if isinstance(speed, bool) or not isinstance(speed, (int, float)):
+        raise ValueError("Speed must be a number")
+    try:
+        reading_time = parse_reading_time(reading['Timestamp'])
+    except (ValueError, TypeError, OverflowError, OSError):
+        raise ValueError("Timestamp must be unix seconds or ISO 8601")
+    return {"key": key, "plate": str(plate_number), "fine": speeding_fine(speed), "time": reading_time}
+
+
+# many readings from one device in one request:
+#   {"DeviceID": "IoT-Radar-01", "Readings": [{"IdempotencyKey", "LicensePlate", "Speed", "Timestamp"}, ...]}
+# all plates are resolved with one query and all violations go in with one INSERT and one commit.
+# A reading whose IdempotencyKey this device already sent returns the stored violation instead of fining again,
+# so a device can safely resend a whole batch after a timeout.
+@app.route('/iot/report-speeding/batch', methods=['POST'])
+def iot_report_speeding_batch():
+    if request.headers.get('X-API-Key') != IOT_API_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    readings = data.get('Readings')
+    device_id = str(data.get('DeviceID') or IOT_DEFAULT_DEVICE)[:80]
+    if not isinstance(readings, list) or not readings:
+        return jsonify({"error": "Readings must be a non-empty list"}), 400
+    if len(readings) > IOT_MAX_BATCH:
+        return jsonify({"error": f"Too many readings, send at most {IOT_MAX_BATCH} per request"}), 400
+
+    results = []
+    valid = []
+    seen = {}
+    for index, reading in enumerate(readings):
+        result = {"index": index, "IdempotencyKey": reading.get('IdempotencyKey') if isinstance(reading, dict) else None}
+        results.append(result)
+        try:
+            parsed = parse_reading(reading)
+        except ValueError as e:
+            result.update({"status": "invalid", "error": str(e)})
+            continue
+        if parsed["key"] in seen:
+            # same key twice in one batch, the first one wins
+            result["status"] = "duplicate"
+            continue
+        seen[parsed["key"]] = result
+        valid.append(parsed)
+
+    stored = {}
+    if valid:
+        db = get_db_connection()
+        if db is None:
+            return jsonify({"error": "Database unavailable"}), 503
+        cursor = db.cursor()
+        # a concurrent retry of the same batch can insert a key between our check and our INSERT,
+        # the duplicate key error rolls us back and the next pass finds its violations.
+        # a deadlock against a concurrent batch registering the same new plates is run again too
+        for attempt in range(BATCH_WRITE_ATTEMPTS):
+            try:
+                stored = record_device_violations(cursor, device_id, "Speeding", valid, IOT_LOCATION)
+                db.commit()
+                read_cache.violations_added([(reading["plate"], device_id) for reading in valid
+                                             if stored[reading["key"]][1]])
+                break
+            except mysql.connector.IntegrityError as e:
+                db.rollback()
+                # a cached vehicle may have been deleted, look the plates up again
+                for reading in valid:
+                    vehicle_registry.forget(reading["plate"])
+                if attempt == BATCH_WRITE_ATTEMPTS - 1:
+                    print(f"Error in /iot/report-speeding/batch: {e}")
+                    return jsonify({"error": f"Could not store the batch: {e}"}), 409
+            except mysql.connector.Error as e:
+                db.rollback()
+                if e.errno == DEADLOCK and attempt < BATCH_WRITE_ATTEMPTS - 1:
+                    continue
+                print(f"Error in /iot/report-speeding/batch: {e}")
+                return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+        cursor.close()
+        db.close()
+
+    for key, result in seen.items():
+        violation_id, created = stored[key]
+        result.update({"status": "created" if created else "duplicate", "violation_id": violation_id})
+    for result in results:
+        if result["status"] == "duplicate" and "violation_id" not in result and result["IdempotencyKey"] in stored:
+            result["violation_id"] = stored[result["IdempotencyKey"]][0]
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return jsonify({"device": device_id, "counts": counts, "results": results}), 200
+
+
 
 
 
@@ -723,78 +1007,207 @@ def iot_report_speeding():
 @app.route('/get-violations/<license_plate>', methods=['GET'])
 def get_violations(license_plate):
 
-    try:
+    def load():
         db = get_db_connection()
         if not db:
-            return jsonify({"error": "Database connection failed"}), 500
+            return {"error": "Database connection failed"}, 500
 
-        cursor = db.cursor()
+        cursor = db.cursor(dictionary=True)
+        query_plate_violations(cursor, [license_plate], [])
+        groups = list(group_plate_violations(cursor))
+        cursor.close()
+        db.close()
 
-        # get vehicle ID from license plate
-        cursor.execute("SELECT VehicleID FROM Vehicle WHERE LicensePlate = %s", (license_plate,))
-        vehicle = cursor.fetchone()
+        if not groups:
+            return {"error": "Vehicle not found"}, 404
+        violations = groups[0][2]
+        if not violations:
+            return {"message": "No violations found for this vehicle."}, 404
+        return violations, 200
 
-        if not vehicle:
-            cursor.close()
-            db.close()
-            return jsonify({"error": "Vehicle not found"}), 404
+    try:
+        body, status = read_cache.cache.response(violations_key(license_plate), load)
+        return jsonify(body), status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        vehicle_id = vehicle[0]
 
-        # fetch violations
-        cursor.execute("SELECT * FROM Violations WHERE VehicleID = %s", (vehicle_id,))
-        violations = cursor.fetchall()
+LOOKUP_MAX_PLATES = int(os.environ.get("LOOKUP_MAX_PLATES", 500))
 
-        if not violations:
-            cursor.close()
-            db.close()
-            return jsonify({"message": "No violations found for this vehicle."}), 404
-
-        results = [{
-            "ViolationID": v[0],
-            "VehicleID": v[1],
-            "DateTime": v[2].strftime('%Y-%m-%d %H:%M:%S'),
-            "ViolationType": v[3],
-            "FineAmount": float(v[4]),
-            "Status": v[5],
-            "Location": v[6],
-            "evidence_image": v[8] if len(v) > 8 and v[8] is not None else None
-        } for v in violations]
 
+# violations for many plates at once, for enforcement clients checking a whole list
+#   POST /violations/lookup  {"plates": ["KA01AB1234", ...], "status": "Unpaid", "from": "2024-01-01", "to": "2024-02-01"}
+# streams one JSON line per plate (application/x-ndjson), known plates in plate order and then the unknown ones:
+#   {"LicensePlate": "KA01AB1234", "found": true, "VehicleID": 7, "violations": [{...}, ...]}
+#   {"LicensePlate": "ZZ00ZZ0000", "found": false, "VehicleID": null, "violations": []}
+@app.route('/violations/lookup', methods=['POST'])
+@jwt_required()
+def lookup_violations():
+    data = request.get_json(silent=True) or {}
+    plates = data.get("plates")
+    if not isinstance(plates, list) or not plates or not all(isinstance(p, str) and p.strip() for p in plates):
+        return jsonify({"error": "plates must be a non-empty list of license plates"}), 400
+    plates = sorted(set(p.strip().upper() for p in plates))
+    if len(plates) > LOOKUP_MAX_PLATES:
+        return jsonify({"error": f"At most {LOOKUP_MAX_PLATES} plates per lookup"}), 400
+
+    # same filters and checks as /violations and /violations/export
+    try:
+        filters = parse_violation_filters(data)
+    except ListingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db = get_db_connection()
+    if not db:
+        return jsonify({"error": "Database connection failed"}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        # run the query before the response starts so a failure is still a plain error response
+        query_plate_violations(cursor, plates, filters)
+    except mysql.connector.Error as e:
         cursor.close()
-        db.close()
-        return jsonify(results), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    # rows are read from the server as they are sent, the connection is handed back when the stream ends
+    def generate():
+        found = set()
+        finished = False
+        try:
+            for plate, vehicle_id, violations in group_plate_violations(cursor):
+                found.add(plate.upper())
+                yield json.dumps({"LicensePlate": plate, "found": True, "VehicleID": vehicle_id, "violations": violations}) + "\n"
+            finished = True
+            for plate in plates:
+                if plate not in found:
+                    yield json.dumps({"LicensePlate": plate, "found": False, "VehicleID": None, "violations": []}) + "\n"
+        except Exception as e:
+            print(f"Error in /violations/lookup: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            close_streamed_cursor(db, cursor, finished)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+# close an unbuffered cursor at the end of a streamed response. finished is False when the stream stopped
+# before the last row (client went away, error): the server is still sending the result and closing the cursor
+# or rolling back would read all of it into memory first, so the connection is dropped from the pool instead
+def close_streamed_cursor(db, cursor, finished):
+    if not finished:
+        db.discard()
+        return
+    try:
+        cursor.close()
+    except mysql.connector.Error:
+        db.discard()
+
+
+# bulk export of violations with their vehicle and payments, for reports
+#   GET /violations/export?format=csv&from=2024-01-01&to=2024-02-01&status=Unpaid
+# format is csv (default) or ndjson. One row per violation and payment: a violation paid twice has two rows,
+# an unpaid one has empty payment columns. Rows are read from the server side cursor EXPORT_CHUNK_ROWS at a time
+# and sent as they come, so memory stays flat however many rows match and the header goes out straight away.
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 500))
+
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return "" if value is None else value
+
+
+@app.route('/violations/export', methods=['GET'])
+@jwt_required()
+def export_violations():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    try:
+        filters = parse_violation_filters(request.args)
+    except ListingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db = get_db_connection()
+    if not db:
+        return jsonify({"error": "Database connection failed"}), 500
+    # unbuffered: rows stay on the server until fetched
+    cursor = db.cursor()
+    try:
+        query_export(cursor, filters)
+    except mysql.connector.Error as e:
+        close_streamed_cursor(db, cursor, True)
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    names = [name for name, _ in EXPORT_COLUMNS]
+
+    def generate():
+        exported = 0
+        finished = False
+        try:
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(names)
+                yield buffer.getvalue()
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    finished = True
+                    break
+                exported += len(rows)
+                if export_format == 'csv':
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows([csv_value(v) for v in row] for row in rows)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(dict(zip(names, map(json_value, row)))) + "\n" for row in rows)
+        except Exception as e:
+            # the status line is long gone, the best we can do is end the file with the error
+            print(f"Error in /violations/export after {exported} rows: {e}")
+            yield f"# export failed: {e}\n" if export_format == 'csv' else json.dumps({"error": str(e)}) + "\n"
+        finally:
+            close_streamed_cursor(db, cursor, finished)
+
+    filename = f"violations-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    mimetype = "text/csv" if export_format == 'csv' else "application/x-ndjson"
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # keep proxies from collecting the whole export before passing it on
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 #get violation from violation id
 @app.route('/get-violation/<int:violation_id>', methods=['GET'])
 @jwt_required()
 def get_violation(violation_id):
-    try:
+
+    def load():
         db = get_db_connection()
         if not db:
-            return jsonify({"error": "Database connection failed"}), 500
+            return {"error": "Database connection failed"}, 500
 
         cursor = db.cursor()
-        cursor.execute("SELECT * FROM Violations WHERE ViolationID = %s", (violation_id,))
+        cursor.execute("SELECT ViolationID, FineAmount, Status FROM Violations WHERE ViolationID = %s", (violation_id,))
         violation = cursor.fetchone()
+        cursor.close()
+        db.close()
 
         if not violation:
-            cursor.close()
-            db.close()
-            return jsonify({"error": "Violation not found"}), 404
+            return {"error": "Violation not found"}, 404
 
         violation_data = {
             "ViolationID": violation[0],
-            "FineAmount": float(violation[4]),
-            "Status": violation[5],
-        
+            "FineAmount": float(violation[1]),
+            "Status": violation[2],
         }
-        cursor.close()
-        db.close()
-        return jsonify(violation_data), 200
+        return violation_data, 200
+
+    try:
+        body, status = read_cache.cache.response(violation_key(violation_id), load)
+        return jsonify(body), status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -817,8 +1230,9 @@ def pay_fine(violation_id):
 
         cursor = db.cursor()
         
-        # Verify violation exists and get amount
-        cursor.execute("SELECT FineAmount FROM Violations WHERE ViolationID = %s", (violation_id,))
+        # Verify violation exists and get amount (and the plate, its cached violation list changes too)
+        cursor.execute("SELECT v.FineAmount, ve.LicensePlate FROM Violations v JOIN Vehicle ve ON ve.VehicleID = v.VehicleID "
+                       "WHERE v.ViolationID = %s", (violation_id,))
         violation = cursor.fetchone()
         
         if not violation:
@@ -828,9 +1242,10 @@ def pay_fine(violation_id):
 
         #i havent added any payment gateway here yet
         
-        # Update violation status
-        cursor.execute("UPDATE Violations SET Status = 'Paid' WHERE ViolationID = %s", (violation_id,))
-        db.commit()
+        # Update violation status, only an Unpaid -> Paid change moves the dashboard totals
+        cursor.execute("UPDATE Violations SET Status = 'Paid' WHERE ViolationID = %s AND Status = 'Unpaid'", (violation_id,))
+        if cursor.rowcount == 1:
+            dashboard_stats.record_fine_paid(cursor, violation[0])
 
         # Record payment
         cursor.execute("""
@@ -838,6 +1253,7 @@ def pay_fine(violation_id):
             VALUES (%s, 'Completed', %s, NOW(), %s)
         """, (violation_id, payment_method, float(violation[0])))
         db.commit()
+        read_cache.cache.invalidate(violation_key(violation_id), violations_key(violation[1]))
 
         cursor.close()
         db.close()
@@ -852,5 +1268,16 @@ def pay_fine(violation_id):
         return jsonify({"error": f"Payment processing failed: {str(e)}"}), 400
     
 # run the Flask app
+API_HOST = os.environ.get("API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("API_PORT", 5000))
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    if API_WORKERS > 0:
+        from prefork import serve
+        serve(app, API_HOST, API_PORT, API_WORKERS)
+    else:
+        import signal
+        import sys
+        # exit normally on SIGTERM so atexit drains the violation buffer
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        app.run(host=API_HOST, port=API_PORT, debug=True)
\ No newline at end of file
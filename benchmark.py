@@ -0,0 +1,361 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+import evidence_store
+
+# Per-stage benchmark of the detection pipeline, run it on the machine you want to size.
+#
+#   python benchmark.py                              all stages over Media/ and evidence_uploads/
+#   python benchmark.py --scales 0.5,1,2 --repeat 3  plus resized copies of every image, 3 timed passes
+#   python benchmark.py --db                         also time the violation inserts (rolled back afterwards)
+#   python benchmark.py --api-url http://localhost:5000 --username devAdmin --password ... --allow-writes
+#                                                    also time POST /autodetect end to end. These are real requests:
+#                                                    every detected violation (and new vehicle) is committed and
+#                                                    stays, so point that API at a scratch database (DB_NAME)
+#   python benchmark.py --compare before.json after.json
+#
+# Stages: decode (the reduced preview), helmet inference, decode_full (only for images with a violation),
+# plate inference, ocr, annotation, encode, db write, and the whole detect_uploads call as "pipeline".
+# Every stage gets wall time, throughput and the peak RSS seen while it ran.
+# Results go to a JSON file so two runs (before / after a change) can be compared.
+# Images are read from the folders and their subfolders (the sharded evidence layout), thumbnails are skipped.
+
+IMAGE_DIRS = ["Media", "evidence_uploads"]
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+STAGES = ["decode", "helmet_inference", "decode_full", "plate_inference", "ocr", "annotation", "encode", "db_write", "pipeline", "api_autodetect"]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # no /proc, fall back to the peak so far (kilobytes on linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+# samples the resident set size in the background, peak() is the highest value since reset()
+class RssSampler:
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._peak = rss_mb()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            value = rss_mb()
+            with self._lock:
+                self._peak = max(self._peak, value)
+
+    def reset(self):
+        with self._lock:
+            self._peak = rss_mb()
+
+    def peak(self):
+        value = rss_mb()
+        with self._lock:
+            self._peak = max(self._peak, value)
+            return self._peak
+
+    def stop(self):
+        self._stop.set()
+
+
+class StageTimer:
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.samples = {}  # stage -> list of (seconds, items, peak rss)
+
+    def run(self, stage, fn, *args, items=1):
+        self.sampler.reset()
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        self.samples.setdefault(stage, []).append((elapsed, items, self.sampler.peak()))
+        return result
+
+
+def summarize(samples):
+    times = np.array([s[0] for s in samples])
+    items = sum(s[1] for s in samples)
+    total = float(times.sum())
+    return {
+        "calls": len(samples),
+        "items": items,
+        "total_s": round(total, 4),
+        "mean_ms": round(float(times.mean()) * 1000, 3),
+        "p50_ms": round(float(np.percentile(times, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(times, 95)) * 1000, 3),
+        "throughput_per_s": round(items / total, 2) if total else 0.0,
+        "peak_rss_mb": round(max(s[2] for s in samples), 1),
+    }
+
+
+def load_images(dirs, limit=0):
+    paths = []
+    for d in dirs:
+        for pattern in IMAGE_PATTERNS:
+            paths.extend(p for p in glob.glob(os.path.join(d, "**", pattern), recursive=True)
+                         if evidence_store.THUMBNAIL_DIR not in os.path.relpath(p, d).split(os.sep)[:-1])
+    paths = sorted(paths)[:limit or None]
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append((path, f.read()))
+    return images
+
+
+# the original bytes plus a re-encoded resized copy for every scale other than 1
+def with_variants(images, scales):
+    variants = []
+    for path, contents in images:
+        ext = os.path.splitext(path)[1].lower()
+        img = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"Skipping {path}, not an image")
+            continue
+        for scale in scales:
+            if scale == 1:
+                variants.append((path, 1.0, ext, contents))
+                continue
+            size = (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale)))
+            resized = cv2.resize(img, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+            ok, encoded = cv2.imencode(ext, resized)
+            if ok:
+                variants.append((path, scale, ext, encoded.tobytes()))
+    return variants
+
+
+# one pass of the pipeline, stage by stage, mirroring detection.detect_uploads for a single image
+def run_stages(det, timer, contents, ext, db_cursor=None):
+    preview = timer.run("decode", det.decode_preview, contents)
+    if preview is None:
+        return
+
+    model_input = det.fit_to_size(preview, det.HELMET_IMGSZ)
+    helmet_result = timer.run("helmet_inference", lambda: det.helmet_model(model_input, imgsz=det.HELMET_IMGSZ, verbose=False)[0])
+    rider_boxes = det.helmet_violation_boxes(helmet_result)
+
+    if not rider_boxes:
+        return
+    plate_texts = {}
+    # the full resolution image is only decoded for frames with a violation
+    img = timer.run("decode_full", det.decode_image, contents)
+    rider_boxes = det.scale_boxes(rider_boxes, model_input.shape, img.shape)
+    area = det.plate_search_area(rider_boxes, img.shape)
+
+    def plate_inference():
+        result = det.plate_model(det.crop_region(img, area), conf=0.1, imgsz=det.PLATE_IMGSZ, verbose=False)[0]
+        return det.plate_boxes_in_image(result, area)
+    plate_boxes = timer.run("plate_inference", plate_inference)
+
+    nearest = det.match_plates_to_riders(rider_boxes, plate_boxes, img.shape)
+    wanted = sorted(set(int(n) for n in nearest if n >= 0))
+    padded = {p: det.pad_plate_box(plate_boxes[p], img.shape) for p in wanted}
+    if wanted:
+        texts = timer.run("ocr", det.ocr_plate_crops, [det.crop_region(img, padded[p]) for p in wanted], items=len(wanted))
+        plate_texts = dict(zip(wanted, texts))
+    records = [(det.VIOLATION_TYPE, plate_texts.get(int(p)) if p >= 0 else None) for p in nearest]
+
+    # drawn on the decoded image itself, like detect_uploads does
+    def annotate():
+        for box in rider_boxes:
+            det.draw_rider_box(img, box)
+        for p, text in plate_texts.items():
+            if text:
+                det.draw_plate_box(img, padded[p], text)
+        return img
+    annotated = timer.run("annotation", annotate)
+    # what an evidence writer thread does with it, with the configured EVIDENCE_FORMAT / QUALITY / MAX_DIM
+    out_ext = evidence_store.output_extension(ext)
+    timer.run("encode", lambda: cv2.imencode(out_ext, evidence_store.downscale(annotated, evidence_store.EVIDENCE_MAX_DIM),
+                                             evidence_store.encode_params(out_ext)))
+
+    plates = sorted(set(plate for _, plate in records if plate))
+    if db_cursor is not None and plates:
+        from violation_store import record_auto_violation
+
+        def db_write():
+            for plate in plates:
+                record_auto_violation(db_cursor, det.VIOLATION_TYPE, plate, "benchmark.jpg")
+        timer.run("db_write", db_write, items=len(plates))
+
+
+def post_autodetect(session, api_url, token, filename, contents):
+    response = session.post(f"{api_url}/autodetect", headers={"Authorization": f"Bearer {token}"},
+                            files={"image_file": (os.path.basename(filename), contents)})
+    if response.status_code >= 500:
+        raise RuntimeError(f"/autodetect answered {response.status_code}: {response.text[:200]}")
+    return response.status_code
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    scales = [float(s) for s in args.scales.split(",")]
+    variants = with_variants(load_images(args.dirs, args.limit), scales)
+    if not variants:
+        raise SystemExit(f"No images found in {', '.join(args.dirs)}")
+    print(f"{len(variants)} image(s) ({len(variants) // len(scales)} files x scales {scales}), "
+          f"{args.warmup} warmup + {args.repeat} timed pass(es)")
+
+    if not args.ocr_cache:
+        os.environ["OCR_CACHE_SIZE"] = "0"
+    import detection as det
+    from detection_config import INFERENCE_BACKEND, INFERENCE_INT8, INFERENCE_THREADS
+
+    db = cursor = None
+    if args.db:
+        from db_pool import ConnectionPool
+        pool = ConnectionPool(size=1)
+        db = pool.get_connection()
+        cursor = db.cursor()
+
+    token = None
+    session = None
+    if args.api_url:
+        print(f"WARNING: POST /autodetect on {args.api_url} commits every violation it detects, "
+              f"{len(variants) * (args.warmup + args.repeat)} uploads will be sent")
+        import requests
+        session = requests.Session()
+        token = args.token
+        if not token:
+            response = session.post(f"{args.api_url}/login", json={"username": args.username, "password": args.password})
+            response.raise_for_status()
+            token = response.json()["token"]
+
+    sampler = RssSampler()
+    by_scale = {scale: StageTimer(sampler) for scale in scales}
+    warmup = StageTimer(sampler)
+    try:
+        for n in range(args.warmup + args.repeat):
+            timed = n >= args.warmup
+            for path, scale, ext, contents in variants:
+                timer = by_scale[scale] if timed else warmup
+                run_stages(det, timer, contents, ext, cursor)
+                timer.run("pipeline", det.detect_uploads, [contents])
+                if session is not None:
+                    timer.run("api_autodetect", post_autodetect, session, args.api_url, token, path, contents)
+                if db is not None:
+                    # --db rows never stay in the database (unlike the ones --api-url makes through the API)
+                    db.rollback()
+            print(f"  pass {n + 1}/{args.warmup + args.repeat}{'' if timed else ' (warmup)'} done")
+    finally:
+        sampler.stop()
+        if db is not None:
+            db.rollback()
+            cursor.close()
+            db.close()
+
+    all_samples = {}
+    for timer in by_scale.values():
+        for stage, samples in timer.samples.items():
+            all_samples.setdefault(stage, []).extend(samples)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": INFERENCE_BACKEND,
+            "int8": INFERENCE_INT8,
+            "threads": INFERENCE_THREADS,
+            "helmet_imgsz": det.HELMET_IMGSZ,
+            "plate_imgsz": det.PLATE_IMGSZ,
+            "ocr_cache": args.ocr_cache,
+            "images": len(variants),
+            "scales": scales,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+        },
+        "stages": {stage: summarize(all_samples[stage]) for stage in STAGES if stage in all_samples},
+        "by_scale": {str(scale): {stage: summarize(timer.samples[stage]) for stage in STAGES if stage in timer.samples}
+                     for scale, timer in by_scale.items()},
+    }
+
+
+def print_results(results):
+    print(f"\n{'stage':<18}{'calls':>7}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'items/s':>10}{'peak MB':>10}")
+    for stage, s in results["stages"].items():
+        print(f"{stage:<18}{s['calls']:>7}{s['total_s']:>10.3f}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+              f"{s['p95_ms']:>10.2f}{s['throughput_per_s']:>10.2f}{s['peak_rss_mb']:>10.1f}")
+
+
+# per-stage difference between two saved runs, negative time change is faster
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before_path} ({before['meta'].get('git_commit')}, {before['meta'].get('backend')})")
+    print(f"after:  {after_path} ({after['meta'].get('git_commit')}, {after['meta'].get('backend')})")
+    print(f"\n{'stage':<18}{'mean ms':>22}{'change':>10}{'p95 ms':>22}{'peak MB':>18}")
+    for stage in STAGES:
+        b = before["stages"].get(stage)
+        a = after["stages"].get(stage)
+        if not a or not b:
+            continue
+        change = (a["mean_ms"] - b["mean_ms"]) / b["mean_ms"] * 100 if b["mean_ms"] else 0.0
+        print(f"{stage:<18}{b['mean_ms']:>10.2f} -> {a['mean_ms']:<8.2f}{change:>+9.1f}%"
+              f"{b['p95_ms']:>10.2f} -> {a['p95_ms']:<8.2f}{b['peak_rss_mb']:>7.1f} -> {a['peak_rss_mb']:<7.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the detection pipeline")
+    parser.add_argument("--dirs", nargs="+", default=IMAGE_DIRS, help="folders with the benchmark images")
+    parser.add_argument("--scales", default="1", help="comma separated resize factors, e.g. 0.5,1,2")
+    parser.add_argument("--limit", type=int, default=0, help="use at most this many files, 0 for all")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the images")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes first (model load, caches)")
+    parser.add_argument("--ocr-cache", action="store_true", help="keep the plate OCR cache on (off by default, it hides the OCR cost)")
+    parser.add_argument("--db", action="store_true", help="time the violation inserts too, every pass is rolled back")
+    parser.add_argument("--api-url", help="also time POST /autodetect on a running API, e.g. http://localhost:5000. "
+                                          "Violations it detects are committed, use an API on a scratch database")
+    parser.add_argument("--allow-writes", action="store_true",
+                        help="confirm that --api-url may add violations and vehicles to the API's database")
+    parser.add_argument("--token", help="JWT for --api-url, otherwise log in with --username / --password")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--output", default=None, help="JSON results file (default benchmark-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved results and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        raise SystemExit(0)
+    if args.api_url and not args.token and not (args.username and args.password):
+        parser.error("--api-url needs --token or --username and --password")
+    if args.api_url and not args.allow_writes:
+        parser.error("--api-url records every detected violation for real and nothing rolls it back, "
+                     "run it against an API on a scratch database and add --allow-writes")
+
+    results = run_benchmark(args)
+    print_results(results)
+    output = args.output or time.strftime("benchmark-%Y%m%d-%H%M%S.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {output}")
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+
+# Dashboard counters kept in DashboardStats (one row) and ViolationTypeCounts,
+# updated in the same transaction as the write they describe so they never drift.
+# The record_* functions take the callers cursor and do not commit.
+#
+#   python dashboard_stats.py reconcile     rebuild the counters from the real tables
+
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", 5))
+
+
+def record_vehicle_added(cursor, count=1):
+    cursor.execute("UPDATE DashboardStats SET TotalVehicles = TotalVehicles + %s WHERE StatsID = 1", (count,))
+
+
+def record_violation_added(cursor, violation_type, fine_amount, count=1):
+    cursor.execute("""
+        UPDATE DashboardStats
+        SET TotalViolations = TotalViolations + %s, TotalUnpaid = TotalUnpaid + %s
+        WHERE StatsID = 1
+    """, (count, fine_amount))
+    cursor.execute("""
+        INSERT INTO ViolationTypeCounts (ViolationType, ViolationCount) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE ViolationCount = ViolationCount + VALUES(ViolationCount)
+    """, (violation_type, count))
+
+
+# call only when the violation actually went from Unpaid to Paid
+def record_fine_paid(cursor, fine_amount):
+    cursor.execute("""
+        UPDATE DashboardStats
+        SET TotalPaid = TotalPaid + %s, TotalUnpaid = TotalUnpaid - %s
+        WHERE StatsID = 1
+    """, (fine_amount, fine_amount))
+
+
+# call before deleting the vehicle, its violations go with it (ON DELETE CASCADE)
+def record_vehicle_deleted(cursor, vehicle_id):
+    cursor.execute("""
+        SELECT ViolationType, COUNT(*),
+               COALESCE(SUM(CASE WHEN Status = 'Paid' THEN FineAmount END), 0),
+               COALESCE(SUM(CASE WHEN Status = 'Unpaid' THEN FineAmount END), 0)
+        FROM Violations WHERE VehicleID = %s GROUP BY ViolationType
+    """, (vehicle_id,))
+    rows = cursor.fetchall()
+
+    count = sum(r[1] for r in rows)
+    paid = sum(r[2] for r in rows)
+    unpaid = sum(r[3] for r in rows)
+    cursor.execute("""
+        UPDATE DashboardStats
+        SET TotalVehicles = TotalVehicles - 1, TotalViolations = TotalViolations - %s,
+            TotalPaid = TotalPaid - %s, TotalUnpaid = TotalUnpaid - %s
+        WHERE StatsID = 1
+    """, (count, paid, unpaid))
+    for violation_type, type_count, _, _ in rows:
+        cursor.execute("UPDATE ViolationTypeCounts SET ViolationCount = ViolationCount - %s WHERE ViolationType = %s",
+                       (type_count, violation_type))
+
+
+# rebuild every counter from the real tables, the caller commits
+def reconcile(cursor):
+    cursor.execute("""
+        INSERT INTO DashboardStats (StatsID, TotalVehicles, TotalViolations, TotalPaid, TotalUnpaid)
+        SELECT 1,
+               (SELECT COUNT(*) FROM Vehicle),
+               (SELECT COUNT(*) FROM Violations),
+               (SELECT COALESCE(SUM(FineAmount), 0) FROM Violations WHERE Status = 'Paid'),
+               (SELECT COALESCE(SUM(FineAmount), 0) FROM Violations WHERE Status = 'Unpaid')
+        ON DUPLICATE KEY UPDATE
+            TotalVehicles = VALUES(TotalVehicles), TotalViolations = VALUES(TotalViolations),
+            TotalPaid = VALUES(TotalPaid), TotalUnpaid = VALUES(TotalUnpaid)
+    """)
+    cursor.execute("DELETE FROM ViolationTypeCounts")
+    cursor.execute("""
+        INSERT INTO ViolationTypeCounts (ViolationType, ViolationCount)
+        SELECT ViolationType, COUNT(*) FROM Violations WHERE ViolationType IS NOT NULL GROUP BY ViolationType
+    """)
+    invalidate()
+
+
+# short lived in-process cache in front of the summary tables
+_cache = {"stats": None, "expires": 0.0}
+_cache_lock = threading.Lock()
+
+
+def invalidate():
+    with _cache_lock:
+        _cache["expires"] = 0.0
+
+
+# cached stats, or None when they have to be loaded again
+def cached_stats():
+    with _cache_lock:
+        if _cache["stats"] is not None and time.monotonic() < _cache["expires"]:
+            return _cache["stats"]
+    return None
+
+
+def load_stats(cursor):
+    cursor.execute("SELECT TotalVehicles, TotalViolations, TotalPaid, TotalUnpaid FROM DashboardStats WHERE StatsID = 1")
+    row = cursor.fetchone() or (0, 0, 0, 0)
+    cursor.execute("""
+        SELECT ViolationType FROM ViolationTypeCounts
+        WHERE ViolationCount > 0
+        ORDER BY ViolationCount DESC
+        LIMIT 1
+    """)
+    top_violation_result = cursor.fetchone()
+
+    stats = {
+        "total_vehicles": int(row[0]),
+        "total_violations": int(row[1]),
+        "total_paid": float(row[2] or 0),
+        "total_unpaid": float(row[3] or 0),
+        "top_violation": top_violation_result[0] if top_violation_result else "N/A"
+    }
+    with _cache_lock:
+        _cache["stats"] = stats
+        _cache["expires"] = time.monotonic() + DASHBOARD_CACHE_TTL
+    return stats
+
+
+if __name__ == '__main__':
+    import sys
+    from db_pool import ConnectionPool
+
+    if sys.argv[1:] != ["reconcile"]:
+        print("usage: python dashboard_stats.py reconcile")
+        sys.exit(1)
+
+    pool = ConnectionPool(size=1)
+    db = pool.get_connection()
+    cursor = db.cursor()
+    reconcile(cursor)
+    db.commit()
+    print(f"Dashboard counters rebuilt: {load_stats(cursor)}")
+    cursor.close()
+    db.close()
+    pool.close_all()
@@ -0,0 +1,222 @@
+import os
+import queue
+import threading
+import time
+import mysql.connector
+from metrics import DB_CONNECTIONS_CLOSED, DB_CONNECTIONS_OPENED, DB_QUERY_LATENCY, statement_label
+
+
+# pool settings, can be overridden from the environment
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "user": os.environ.get("DB_USER", "root"),
+    "passwd": os.environ.get("DB_PASSWORD", "root"),
+    "database": os.environ.get("DB_NAME", "TrafficDB"),
+}
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+# only ping connections that sat idle longer than this (seconds), 0 = ping on every checkout
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 30))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# cursor wrapper that times every statement into db_query_duration_seconds
+class TimedCursor:
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(operation, params, *args, **kwargs)
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - started, statement_label(operation))
+
+    def executemany(self, operation, seq_params):
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(operation, seq_params)
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - started, statement_label(operation))
+
+
+# wraps a raw mysql connection so that close() hands it back to the pool
+# instead of tearing down the socket, everything else goes to the real connection
+class PooledConnection:
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        # safe to call more than once (route code + request teardown)
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._release(self._raw)
+
+    # drop the connection instead of handing it back, for one left in the middle of a result
+    def discard(self):
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._discard(self._raw, "abandoned")
+
+
+class ConnectionPool:
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, ping_after=DB_POOL_PING_AFTER, **db_config):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.db_config = db_config or DB_CONFIG
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "in_use": 0,
+        }
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self.stats["connects"] += 1
+        DB_CONNECTIONS_OPENED.inc()
+        return raw
+
+    def _close_raw(self, raw, reason):
+        DB_CONNECTIONS_CLOSED.inc(reason)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _take_idle(self, block):
+        try:
+            if block:
+                return self._idle.get(timeout=self.timeout)
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    def get_connection(self):
+        item = self._take_idle(block=False)
+
+        if item is None:
+            # open a new one if we are still under the pool size
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+                item = (raw, time.monotonic())
+            else:
+                # pool is exhausted, wait for someone to give one back
+                self._count("waits")
+                item = self._take_idle(block=True)
+                if item is None:
+                    self._count("timeouts")
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+
+        raw, last_used = item
+        raw = self._check_alive(raw, last_used)
+
+        with self._lock:
+            self.stats["checkouts"] += 1
+            self.stats["in_use"] += 1
+        return PooledConnection(self, raw)
+
+    # pre-ping connections that were idle for a while, reconnect if the server dropped them
+    def _check_alive(self, raw, last_used):
+        if time.monotonic() - last_used < self.ping_after:
+            return raw
+        try:
+            raw.ping(reconnect=False)
+            return raw
+        except mysql.connector.Error:
+            self._count("reconnects")
+            self._close_raw(raw, "dead")
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+    def _release(self, raw):
+        with self._lock:
+            self.stats["in_use"] -= 1
+        try:
+            # never hand out a connection with a half finished transaction
+            if raw.in_transaction:
+                raw.rollback()
+            self._idle.put((raw, time.monotonic()))
+        except Exception:
+            # broken connection, drop it so the slot can be reopened
+            self._count("discarded")
+            with self._lock:
+                self._opened -= 1
+            self._close_raw(raw, "broken")
+
+    # close a checked out connection without talking to the server again, shutdown() only closes the socket
+    # so rows the server is still sending are never read (close() or rollback() would read them all first)
+    def _discard(self, raw, reason):
+        with self._lock:
+            self.stats["in_use"] -= 1
+            self.stats["discarded"] += 1
+            self._opened -= 1
+        DB_CONNECTIONS_CLOSED.inc(reason)
+        try:
+            raw.shutdown()
+        except Exception:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["open"] = self._opened
+        stats["idle"] = self._idle.qsize()
+        stats["size"] = self.size
+        return stats
+
+    def close_all(self):
+        while True:
+            item = self._take_idle(block=False)
+            if item is None:
+                break
+            with self._lock:
+                self._opened -= 1
+            self._close_raw(item[0], "shutdown")
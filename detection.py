@@ -0,0 +1,465 @@
+import os
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+import easyocr
+from ocr_cache import PlateOCRCache, plate_key
+from metrics import MODEL_ITEMS, MODEL_LATENCY
+from evidence_store import save_evidence
+from model_backends import load_model, set_inference_threads, verify_backend
+from detection_config import (HELMET_WEIGHTS, PLATE_WEIGHTS, INFERENCE_BACKEND, INFERENCE_INT8, INFERENCE_THREADS,
+                              INFERENCE_VERIFY, INFERENCE_VERIFY_IOU, HELMET_IMGSZ, PLATE_IMGSZ)
+
+
+def load_models(backend, int8):
+    helmet = load_model(HELMET_WEIGHTS, backend, int8)
+    plate = load_model(PLATE_WEIGHTS, backend, int8)
+    if backend != "pytorch" and INFERENCE_VERIFY:
+        ok = (verify_backend(HELMET_WEIGHTS, helmet, min_iou=INFERENCE_VERIFY_IOU, imgsz=HELMET_IMGSZ) and
+              verify_backend(PLATE_WEIGHTS, plate, min_iou=INFERENCE_VERIFY_IOU, imgsz=PLATE_IMGSZ, conf=0.1))
+        if not ok:
+            print(f"WARNING: {backend} models do not match the PyTorch ones, falling back to pytorch.")
+            return load_models("pytorch", False)
+    return helmet, plate
+
+
+print(f"Loading ML models ({INFERENCE_BACKEND}{' int8' if INFERENCE_INT8 else ''}) and EasyOCR...")
+try:
+    set_inference_threads(INFERENCE_THREADS)
+    helmet_model, plate_model = load_models(INFERENCE_BACKEND, INFERENCE_INT8)
+    helmet_classNames = ['With Helmet', 'Without Helmet']
+    reader = easyocr.Reader(['en'])
+    print("Models and EasyOCR loaded successfully.")
+except Exception as e:
+    print(f"ERROR: Could not load models or EasyOCR. {e}")
+
+
+# ultralytics and easyocr models are not safe to call from several threads at once,
+# so request threads and job workers take turns on them
+inference_lock = threading.Lock()
+
+
+# run every model once on a blank image so the first real request does not pay for
+# lazy initialisation (weight layout, kernel selection, thread pools)
+def warmup():
+    started = time.perf_counter()
+    blank = np.zeros((HELMET_IMGSZ, HELMET_IMGSZ, 3), dtype=np.uint8)
+    with inference_lock:
+        helmet_model([blank], imgsz=HELMET_IMGSZ, verbose=False)
+        plate_model([blank[:PLATE_IMGSZ, :PLATE_IMGSZ]], conf=0.1, imgsz=PLATE_IMGSZ, verbose=False)
+        reader.readtext_batched([blank[:OCR_MAX_HEIGHT // 2, :OCR_MAX_HEIGHT * 2]])
+    print(f"Models warmed up in {time.perf_counter() - started:.2f} s")
+
+
+#model stuff
+
+VIOLATION_TYPE = 'Without Helmet'
+
+
+# boxes (x1, y1, x2, y2) of every rider without a helmet in one helmet result
+def helmet_violation_boxes(helmet_result):
+    boxes = []
+    for box in helmet_result.boxes:
+        if helmet_classNames[int(box.cls[0])] == VIOLATION_TYPE:
+            boxes.append(tuple(map(int, box.xyxy[0])))
+    return boxes
+
+
+#Draw the -Without Helmet box
+def draw_rider_box(annotated_img, box):
+    x1, y1, x2, y2 = box
+    cv2.rectangle(annotated_img, (x1, y1), (x2, y2), (0, 0, 255), 2) # Red box
+    cv2.putText(annotated_img, VIOLATION_TYPE, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+
+
+#Draw "License Plate" box
+def draw_plate_box(annotated_img, box, plate_text):
+    px1, py1, px2, py2 = box
+    cv2.rectangle(annotated_img, (px1, py1), (px2, py2), (0, 255, 0), 2) # Green box
+    cv2.putText(annotated_img, plate_text, (px1, py1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+
+
+# plate search region, the area below and around the offending rider
+# sizes are in multiples of the rider box, the helmet model boxes heads so the plate sits well below
+PLATE_ROI_ENABLED = os.environ.get("PLATE_ROI_ENABLED", "1") == "1"
+PLATE_ROI_WIDTH = float(os.environ.get("PLATE_ROI_WIDTH", 4.0))
+PLATE_ROI_HEIGHT = float(os.environ.get("PLATE_ROI_HEIGHT", 8.0))
+# max plate crop height handed to OCR
+OCR_MAX_HEIGHT = int(os.environ.get("OCR_MAX_HEIGHT", 96))
+
+
+# search region of every rider at once, rider_boxes is (n, 4), returns (n, 4) clipped to the image
+def plate_search_regions(rider_boxes, img_shape):
+    h, w = img_shape[:2]
+    boxes = np.asarray(rider_boxes, dtype=np.float32).reshape(-1, 4)
+    if not PLATE_ROI_ENABLED:
+        return np.tile(np.array([0, 0, w, h], dtype=np.int32), (len(boxes), 1))
+
+    box_w = np.maximum(1, boxes[:, 2] - boxes[:, 0])
+    box_h = np.maximum(1, boxes[:, 3] - boxes[:, 1])
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    regions = np.stack([
+        cx - box_w * PLATE_ROI_WIDTH / 2,
+        boxes[:, 1],
+        cx + box_w * PLATE_ROI_WIDTH / 2,
+        boxes[:, 1] + box_h * PLATE_ROI_HEIGHT,
+    ], axis=1)
+    regions = np.clip(regions, 0, [w, h, w, h])
+    return regions.astype(np.int32)
+
+
+# one crop per frame covering every riders search region, so the plate model runs once per frame
+def plate_search_area(rider_boxes, img_shape):
+    regions = plate_search_regions(rider_boxes, img_shape)
+    return (int(regions[:, 0].min()), int(regions[:, 1].min()),
+            int(regions[:, 2].max()), int(regions[:, 3].max()))
+
+
+def crop_region(img, region):
+    rx1, ry1, rx2, ry2 = region
+    return img[ry1:ry2, rx1:rx2]
+
+
+# plate boxes (m, 4) from a plate result that ran on the search area, shifted back to full image coordinates
+def plate_boxes_in_image(plate_result, area):
+    boxes = plate_result.boxes.xyxy
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+    boxes = boxes.cpu().numpy() if hasattr(boxes, "cpu") else np.asarray(boxes)
+    return (boxes + [area[0], area[1], area[0], area[1]]).astype(np.int32)
+
+
+# index of the nearest plate for each rider (-1 when there is none in its search region)
+# distance is from the bottom centre of the rider box to the plate centre, in rider box heights
+def match_plates_to_riders(rider_boxes, plate_boxes, img_shape):
+    riders = np.asarray(rider_boxes, dtype=np.float32).reshape(-1, 4)
+    plates = np.asarray(plate_boxes, dtype=np.float32).reshape(-1, 4)
+    if len(riders) == 0 or len(plates) == 0:
+        return np.full(len(riders), -1, dtype=np.int64)
+
+    regions = plate_search_regions(riders, img_shape)
+    pcx = (plates[:, 0] + plates[:, 2]) / 2
+    pcy = (plates[:, 1] + plates[:, 3]) / 2
+
+    # (n, m) matrices, riders along rows and plates along columns
+    inside = ((pcx[None, :] >= regions[:, 0:1]) & (pcx[None, :] <= regions[:, 2:3]) &
+              (pcy[None, :] >= regions[:, 1:2]) & (pcy[None, :] <= regions[:, 3:4]))
+    rcx = ((riders[:, 0] + riders[:, 2]) / 2)[:, None]
+    rby = riders[:, 3:4]
+    box_h = np.maximum(1, riders[:, 3:4] - riders[:, 1:2])
+    dist = np.hypot(pcx[None, :] - rcx, pcy[None, :] - rby) / box_h
+    dist[~inside] = np.inf
+
+    nearest = dist.argmin(axis=1)
+    nearest[~np.isfinite(dist.min(axis=1))] = -1
+    return nearest
+
+
+# shrink a plate crop before OCR, easyocr works on small text lines anyway
+def shrink_for_ocr(plate_crop):
+    h, w = plate_crop.shape[:2]
+    if h <= OCR_MAX_HEIGHT:
+        return plate_crop
+    scale = OCR_MAX_HEIGHT / h
+    return cv2.resize(plate_crop, (max(1, int(w * scale)), OCR_MAX_HEIGHT), interpolation=cv2.INTER_AREA)
+
+
+# an image uploaded again (retried or re-sent) gives the exact same plate crop,
+# those reuse the earlier OCR result instead of going through easyocr again
+OCR_CACHE_SIZE = int(os.environ.get("OCR_CACHE_SIZE", 1024))
+OCR_CACHE_TTL = float(os.environ.get("OCR_CACHE_TTL", 3600))
+
+ocr_cache = PlateOCRCache(max_size=OCR_CACHE_SIZE, ttl=OCR_CACHE_TTL)
+
+
+# OCR a list of plate crops, cache hits skip easyocr and the rest are
+# padded to a common size so easyocr can take them in one batched call
+def ocr_plate_crops(crops):
+    texts = [None] * len(crops)
+    keys = [None] * len(crops)
+    todo = []
+    for i, crop in enumerate(crops):
+        if crop.size == 0:
+            continue
+        keys[i] = plate_key(crop)
+        texts[i] = ocr_cache.get(keys[i])
+        if texts[i] is None:
+            todo.append(i)
+
+    if not todo:
+        return texts
+
+    small = [shrink_for_ocr(crops[i]) for i in todo]
+    max_h = max(c.shape[0] for c in small)
+    max_w = max(c.shape[1] for c in small)
+    padded = [cv2.copyMakeBorder(c, 0, max_h - c.shape[0], 0, max_w - c.shape[1], cv2.BORDER_CONSTANT, value=(0, 0, 0))
+              for c in small]
+
+    try:
+        # Run OCR
+        with MODEL_LATENCY.time("ocr"):
+            ocr_results = reader.readtext_batched(padded)
+        MODEL_ITEMS.inc("ocr", amount=len(padded))
+        for i, ocr_result in zip(todo, ocr_results):
+            if ocr_result:
+                plate_text = ocr_result[0][1]
+                texts[i] = "".join(filter(str.isalnum, plate_text)).upper() or None
+            # only successful reads are cached, a blurry crop gets another try next time
+            if texts[i]:
+                ocr_cache.put(keys[i], texts[i])
+    except Exception as e:
+        print(f"Error during OCR: {e}")
+    return texts
+
+
+def pad_plate_box(box, img_shape, padding=5):
+    px1, py1, px2, py2 = map(int, box)
+    return (max(0, px1 - padding), max(0, py1 - padding),
+            min(img_shape[1], px2 + padding), min(img_shape[0], py2 + padding))
+
+
+# match riders to plates in each frame, OCR every matched plate in one batched call
+# and draw the results, returns one list of (violation, plate, box) records per frame
+# nothing is drawn until every crop has been read, so annotated_imgs may be the frames themselves
+def read_plates_for_riders(imgs, rider_boxes, plate_boxes, annotated_imgs):
+    crops = []
+    crop_owner = []  # (frame, plate index) for every crop
+    matches = []
+    for i, img in enumerate(imgs):
+        nearest = match_plates_to_riders(rider_boxes[i], plate_boxes[i], img.shape)
+        matches.append(nearest)
+        # riders sharing a bike share a plate, only OCR it once
+        for p in sorted(set(int(n) for n in nearest if n >= 0)):
+            padded_box = pad_plate_box(plate_boxes[i][p], img.shape)
+            crops.append(crop_region(img, padded_box))
+            crop_owner.append((i, p, padded_box))
+
+    texts = ocr_plate_crops(crops)
+
+    for i, boxes in enumerate(rider_boxes):
+        for box in boxes:
+            draw_rider_box(annotated_imgs[i], box)
+
+    plate_texts = {}
+    for (i, p, padded_box), text in zip(crop_owner, texts):
+        plate_texts[(i, p)] = text
+        if text:
+            print(f"Plate found: {text}")
+            draw_plate_box(annotated_imgs[i], padded_box, text)
+
+    records = []
+    for i, nearest in enumerate(matches):
+        records.append([(VIOLATION_TYPE, plate_texts.get((i, int(p))) if p >= 0 else None, box)
+                        for box, p in zip(rider_boxes[i], nearest)])
+    return records
+
+
+# downscale an image once so its longest side is the model input size, YOLO then has nothing left to resize
+def fit_to_size(img, size):
+    h, w = img.shape[:2]
+    if max(h, w) <= size:
+        return img
+    scale = size / max(h, w)
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+# boxes found on a resized copy, in the coordinates of the image it was made from
+def scale_boxes(boxes, from_shape, to_shape):
+    if from_shape[:2] == to_shape[:2] or not boxes:
+        return boxes
+    sx = to_shape[1] / from_shape[1]
+    sy = to_shape[0] / from_shape[0]
+    return [(int(x1 * sx), int(y1 * sy), int(x2 * sx), int(y2 * sy)) for x1, y1, x2, y2 in boxes]
+
+
+# single frame helpers for callers that drive the two stages themselves (video ingestion)
+def detect_helmet_violations(img):
+    model_input = fit_to_size(img, HELMET_IMGSZ)
+    with inference_lock, MODEL_LATENCY.time("helmet"):
+        helmet_result = helmet_model(model_input, imgsz=HELMET_IMGSZ)[0]
+    MODEL_ITEMS.inc("helmet")
+    return scale_boxes(helmet_violation_boxes(helmet_result), model_input.shape, img.shape)
+
+
+# plates for the given riders in one frame, returns (violation, plate, box) records
+# the rider and plate boxes are drawn on annotated_img
+def read_plates_in_frame(img, rider_boxes, annotated_img):
+    if not rider_boxes:
+        return []
+    area = plate_search_area(rider_boxes, img.shape)
+    with inference_lock:
+        with MODEL_LATENCY.time("plate"):
+            plate_result = plate_model(crop_region(img, area), conf=0.1, imgsz=PLATE_IMGSZ)[0]
+        MODEL_ITEMS.inc("plate")
+        return read_plates_for_riders([img], [rider_boxes], [plate_boxes_in_image(plate_result, area)], [annotated_img])[0]
+
+
+# returns the list of (violation, plate, box) records and the annotated image (None without a violation)
+def detect_violation_and_plate(img):
+    return detect_violations_batch([img])[0]
+
+
+# run the helmet model over the whole batch in one call, on copies resized once to its input size,
+# then the plate model and OCR at full resolution, only around riders that had a violation
+#
+# imgs are never modified, an annotated copy is only made for frames with a violation.
+# load_original(i), when given, returns the full resolution image for frame i and imgs are only
+# reduced previews (see decode_preview). It is called for frames with a violation only, outside the
+# model lock, and the image it returns is drawn on directly instead of being copied.
+# returns (records, annotated image or None) per input image
+def detect_violations_batch(imgs, load_original=None):
+    model_inputs = [fit_to_size(img, HELMET_IMGSZ) for img in imgs]
+    rider_boxes = [[] for _ in imgs]
+
+    with inference_lock:
+        # Run HelmetDetection
+        with MODEL_LATENCY.time("helmet"):
+            helmet_results = helmet_model(model_inputs, imgsz=HELMET_IMGSZ)
+        MODEL_ITEMS.inc("helmet", amount=len(imgs))
+        for i, r in enumerate(helmet_results):
+            rider_boxes[i] = helmet_violation_boxes(r)
+
+    flagged = [i for i, boxes in enumerate(rider_boxes) if boxes]
+    if not flagged:
+        print("No violations found in this batch.")
+        return [([], None) for _ in imgs]
+
+    print(f"Violation detected in {len(flagged)} of {len(imgs)} image(s)! Searching for license plates...")
+    originals = {}
+    annotated_imgs = {}
+    for i in flagged:
+        original = load_original(i) if load_original is not None else None
+        if original is None:
+            original = imgs[i]
+            annotated_imgs[i] = original.copy()
+        else:
+            annotated_imgs[i] = original
+        originals[i] = original
+        rider_boxes[i] = scale_boxes(rider_boxes[i], model_inputs[i].shape, original.shape)
+
+    # If a violation was found, find the license plates
+    areas = {i: plate_search_area(rider_boxes[i], originals[i].shape) for i in flagged}
+    with inference_lock:
+        with MODEL_LATENCY.time("plate"):
+            plate_results = plate_model([crop_region(originals[i], areas[i]) for i in flagged], conf=0.1, imgsz=PLATE_IMGSZ)
+        MODEL_ITEMS.inc("plate", amount=len(flagged))
+        plate_boxes = [plate_boxes_in_image(r, areas[i]) for i, r in zip(flagged, plate_results)]
+
+        flagged_records = read_plates_for_riders([originals[i] for i in flagged], [rider_boxes[i] for i in flagged],
+                                                 plate_boxes, [annotated_imgs[i] for i in flagged])
+    if not any(plate for frame in flagged_records for _, plate, _ in frame):
+        print("Violation found, but no license plate was read.")
+
+    results = [([], None) for _ in imgs]
+    for i, records in zip(flagged, flagged_records):
+        results[i] = (records, annotated_imgs[i])
+    return results
+
+
+#Read an uploaded image file in memory
+def decode_image(contents):
+    nparr = np.frombuffer(contents, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+# officers upload 12-48 MP photos but the helmet model only looks at HELMET_IMGSZ pixels,
+# so uploads are first decoded at 1/2, 1/4 or 1/8 scale (libjpeg skips most of the work for JPEGs)
+# and the full resolution image is only decoded for the plate crops when there is a violation
+REDUCED_DECODE = os.environ.get("REDUCED_DECODE", "1") == "1"
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+# (width, height) read from a JPEG or PNG header without decoding, None for anything else
+def image_size(contents):
+    if contents[:8] == b"\x89PNG\r\n\x1a\n" and len(contents) >= 24:
+        return struct.unpack(">II", contents[16:24])
+    if contents[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(contents):
+        if contents[i] != 0xFF:
+            return None
+        marker = contents[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">HH", contents[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", contents[i + 2:i + 4])[0]
+    return None
+
+
+# decode an upload at the smallest reduced scale that still covers the helmet model input
+def decode_preview(contents, min_side=HELMET_IMGSZ):
+    flag = cv2.IMREAD_COLOR
+    size = image_size(contents) if REDUCED_DECODE else None
+    if size:
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            if max(size) // factor >= min_side:
+                flag = reduced_flag
+                break
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), flag)
+
+
+# detect on a list of raw uploads, returns (records, annotated image or None) per upload, None when it is not an image
+def detect_uploads(contents_list):
+    previews = []
+    index = []
+    for n, contents in enumerate(contents_list):
+        img = decode_preview(contents)
+        if img is not None:
+            previews.append(img)
+            index.append(n)
+
+    results = [None] * len(contents_list)
+    if previews:
+        detected = detect_violations_batch(previews, lambda i: decode_image(contents_list[index[i]]))
+        for n, result in zip(index, detected):
+            results[n] = result
+    return results
+
+
+#SAVE the annotated image as evidence, returns the stored file name
+# encoding and the disk write happen on the evidence writer threads (see evidence_store.py),
+# the name is known straight away so the violation can be recorded without waiting
+def save_evidence_image(annotated_img, original_filename):
+    stored_name = save_evidence(annotated_img, original_filename)
+    print(f"Evidence file queued as: {stored_name}")
+    return stored_name
+
+
+# one violation per readable plate in a frame, riders sharing a bike are fined once
+def plate_violations(records):
+    violations = []
+    seen = set()
+    for violation_type, plate_number, box in records:
+        if plate_number and plate_number not in seen:
+            seen.add(plate_number)
+            violations.append({"violation_type": violation_type, "license_plate": plate_number})
+    return violations
+
+
+# decode, detect and store evidence for a list of (filename, raw bytes) uploads
+# returns one json friendly result per upload, the caller does the database writes
+def analyze_uploads(uploads):
+    results = [{"filename": filename} for filename, _ in uploads]
+    for i, detected in enumerate(detect_uploads([contents for _, contents in uploads])):
+        if detected is None:
+            results[i]["status"] = "invalid_image"
+            continue
+        records, annotated_img = detected
+        results[i]["riders_without_helmet"] = len(records)
+        results[i]["violation_type"] = records[0][0] if records else None
+        results[i]["violations"] = plate_violations(records)
+        if not records:
+            results[i]["status"] = "no_violation"
+        elif not results[i]["violations"]:
+            results[i]["status"] = "plate_unreadable"
+        else:
+            results[i]["status"] = "violation_found"
+            results[i]["evidence_image"] = save_evidence_image(annotated_img, uploads[i][0])
+    return results
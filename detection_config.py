@@ -0,0 +1,18 @@
+import os
+
+
+# model settings, kept apart from detection.py so tools can read them without loading the models
+
+HELMET_WEIGHTS = "Weights/best.pt"
+PLATE_WEIGHTS = "Weights/license_plate_detector.pt"
+
+# inference backend for both YOLO models: pytorch, onnx or openvino (see export_models.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "pytorch")
+INFERENCE_INT8 = os.environ.get("INFERENCE_INT8", "0") == "1"
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 0))  # 0 = library default
+# compare the exported models against the .pt ones at startup, fall back to pytorch if they disagree
+INFERENCE_VERIFY = os.environ.get("INFERENCE_VERIFY", "1") == "1"
+INFERENCE_VERIFY_IOU = float(os.environ.get("INFERENCE_VERIFY_IOU", 0.8))
+# model input sizes, the plate model runs on the region around the rider so it can be smaller
+HELMET_IMGSZ = int(os.environ.get("HELMET_IMGSZ", 640))
+PLATE_IMGSZ = int(os.environ.get("PLATE_IMGSZ", 320))
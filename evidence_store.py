@@ -0,0 +1,289 @@
+import atexit
+import hashlib
+import os
+import queue
+import re
+import tempfile
+import threading
+from metrics import EVIDENCE_FILES, EVIDENCE_WRITE, Gauge
+
+
+# Content-addressed evidence storage.
+# A file is named by a SHA-256 and sharded by the first two byte pairs of the hash:
+#   evidence_uploads/3f/a2/3fa2...e1.jpg          the annotated image
+#   evidence_uploads/thumbs/3f/a2/3fa2...e1.jpg   a small JPEG for list views
+# The stored name ("3f/a2/3fa2...e1.jpg") is what goes in Violations.evidence_image.
+# Identical evidence is written once, and a name always refers to the same bytes, so clients may cache it forever.
+#
+# New evidence is hashed over the annotated pixels plus the output settings, so its name is known
+# before anything is encoded; a small pool of writer threads then downscales, encodes and writes it
+# in the background (save_evidence). Legacy files being migrated are hashed over their bytes.
+# Files from before this layout (flat "<uuid>.png" names) are still served;
+# `python evidence_store.py migrate` moves them into the new layout.
+
+EVIDENCE_DIR = os.environ.get("EVIDENCE_DIR", "evidence_uploads")
+THUMBNAIL_DIR = "thumbs"
+THUMBNAIL_SIZE = int(os.environ.get("EVIDENCE_THUMBNAIL_SIZE", 320))
+THUMBNAIL_QUALITY = int(os.environ.get("EVIDENCE_THUMBNAIL_QUALITY", 80))
+
+# output codec for new evidence: jpeg, webp, png, or original (the uploads own extension)
+EVIDENCE_FORMAT = os.environ.get("EVIDENCE_FORMAT", "jpeg").lower()
+EVIDENCE_QUALITY = int(os.environ.get("EVIDENCE_QUALITY", 90))
+# longest side of stored evidence in pixels, 0 keeps the full resolution
+EVIDENCE_MAX_DIM = int(os.environ.get("EVIDENCE_MAX_DIM", 0))
+EVIDENCE_WRITERS = int(os.environ.get("EVIDENCE_WRITERS", 2))
+EVIDENCE_WRITE_QUEUE = int(os.environ.get("EVIDENCE_WRITE_QUEUE", 64))
+# decoded frames are big (a 12 MP frame is 36 MB), so the queue is also bounded by the pixels it holds
+EVIDENCE_WRITE_QUEUE_MB = float(os.environ.get("EVIDENCE_WRITE_QUEUE_MB", 256))
+
+FORMAT_EXTENSIONS = {"jpeg": ".jpg", "jpg": ".jpg", "webp": ".webp", "png": ".png"}
+
+_CONTENT_NAME = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.\w+$")
+
+
+def content_name(digest, extension):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+
+# the content hash of a stored name, None for legacy flat names
+def content_hash(name):
+    match = _CONTENT_NAME.match(name or "")
+    return match.group(3) if match else None
+
+
+def thumbnail_name(name):
+    digest = content_hash(name)
+    return f"{THUMBNAIL_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.jpg" if digest else None
+
+
+def evidence_path(name):
+    return os.path.join(EVIDENCE_DIR, *name.split("/"))
+
+
+# write bytes to path through a temp file in the same folder, readers never see a half written file
+def _write_atomic(path, data):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def make_thumbnail(img):
+    import cv2
+    h, w = img.shape[:2]
+    scale = THUMBNAIL_SIZE / max(h, w)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    return encoded.tobytes() if ok else None
+
+
+# store encoded evidence bytes, img (the decoded image) is used for the thumbnail
+# returns the stored name, identical bytes are only written once
+def store_evidence(data, extension, img=None):
+    digest = hashlib.sha256(data).hexdigest()
+    name = content_name(digest, extension)
+    path = evidence_path(name)
+    if os.path.exists(path):
+        EVIDENCE_FILES.inc("deduplicated")
+        return name
+
+    if img is not None:
+        thumbnail = make_thumbnail(img)
+        if thumbnail:
+            _write_atomic(evidence_path(thumbnail_name(name)), thumbnail)
+    # the full image last, its presence marks the evidence as complete
+    _write_atomic(path, data)
+    EVIDENCE_FILES.inc("written")
+    return name
+
+
+def output_extension(original_filename=None):
+    if EVIDENCE_FORMAT == "original":
+        return os.path.splitext(original_filename or "")[1].lower() or ".jpg"
+    if EVIDENCE_FORMAT not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown EVIDENCE_FORMAT: {EVIDENCE_FORMAT} (expected jpeg, webp, png or original)")
+    return FORMAT_EXTENSIONS[EVIDENCE_FORMAT]
+
+
+def encode_params(extension):
+    import cv2
+    if extension in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_QUALITY]
+    if extension == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, EVIDENCE_QUALITY]
+    return []
+
+
+def downscale(img, max_dim):
+    import cv2
+    h, w = img.shape[:2]
+    if max_dim <= 0 or max(h, w) <= max_dim:
+        return img
+    scale = max_dim / max(h, w)
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+# name for an annotated image before it is encoded: hash of the pixels and of everything that changes the output bytes
+def image_name(img, extension):
+    digest = hashlib.sha256(f"{extension}:{EVIDENCE_QUALITY}:{EVIDENCE_MAX_DIM}:{img.shape}".encode())
+    digest.update(memoryview(img if img.flags.c_contiguous else img.copy()).cast("B"))
+    return content_name(digest.hexdigest(), extension)
+
+
+# img is already downscaled to EVIDENCE_MAX_DIM
+def _write_image(img, name, extension):
+    import cv2
+    path = evidence_path(name)
+    if os.path.exists(path):
+        EVIDENCE_FILES.inc("deduplicated")
+        return
+    try:
+        with EVIDENCE_WRITE.time():
+            ok, encoded = cv2.imencode(extension, img, encode_params(extension))
+            if not ok:
+                raise ValueError(f"Could not encode evidence as {extension}")
+            thumbnail = make_thumbnail(img)
+            if thumbnail:
+                _write_atomic(evidence_path(thumbnail_name(name)), thumbnail)
+            _write_atomic(path, encoded.tobytes())
+    except Exception:
+        # the violation row already points at this name, make the missing file visible on /metrics
+        EVIDENCE_FILES.inc("failed")
+        raise
+    EVIDENCE_FILES.inc("written")
+
+
+# background writer threads, cv2 releases the GIL while encoding so they run in parallel with inference
+class EvidenceWriter:
+
+    def __init__(self, workers=EVIDENCE_WRITERS, max_queue=EVIDENCE_WRITE_QUEUE, max_queue_mb=EVIDENCE_WRITE_QUEUE_MB):
+        self.workers = workers
+        self.max_queue_bytes = int(max_queue_mb * 1024 * 1024)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._queued_bytes = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"evidence-writer-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            img, name, extension = self._queue.get()
+            try:
+                _write_image(img, name, extension)
+            except Exception as e:
+                print(f"Error writing evidence {name}: {e}")
+            finally:
+                with self._lock:
+                    self._queued_bytes -= img.nbytes
+                self._queue.task_done()
+
+    # queue the image and return its stored name straight away, the caller must not modify img afterwards.
+    # it is downscaled first so the queue holds stored size frames, and when the queue is full
+    # (count or EVIDENCE_WRITE_QUEUE_MB) the image is written in the calling thread instead of being dropped
+    def submit(self, img, extension):
+        img = downscale(img, EVIDENCE_MAX_DIM)
+        name = image_name(img, extension)
+        if self.workers <= 0:
+            _write_image(img, name, extension)
+            return name
+        self._start()
+        with self._lock:
+            fits = self._queued_bytes + img.nbytes <= self.max_queue_bytes or self._queued_bytes == 0
+            if fits:
+                self._queued_bytes += img.nbytes
+        if fits:
+            try:
+                self._queue.put_nowait((img, name, extension))
+                return name
+            except queue.Full:
+                with self._lock:
+                    self._queued_bytes -= img.nbytes
+        _write_image(img, name, extension)
+        return name
+
+    def queued_bytes(self):
+        with self._lock:
+            return self._queued_bytes
+
+    def depth(self):
+        return self._queue.qsize()
+
+    # wait for queued images to be written, called on exit
+    def drain(self):
+        if self._threads and self._queue.unfinished_tasks:
+            print(f"Writing {self._queue.unfinished_tasks} queued evidence image(s)...")
+            self._queue.join()
+
+
+writer = EvidenceWriter()
+atexit.register(writer.drain)
+Gauge("evidence_write_queue_depth", "Evidence images waiting for a writer thread", writer.depth)
+Gauge("evidence_write_queue_bytes", "Pixel bytes held by evidence images waiting for a writer thread", writer.queued_bytes)
+
+
+# store an annotated image as evidence in the background, returns the name it will have
+def save_evidence(img, original_filename=None):
+    return writer.submit(img, output_extension(original_filename))
+
+
+# move flat legacy files into the content-addressed layout and point their violations at the new names
+def migrate_legacy(db):
+    import cv2
+    import numpy as np
+
+    cursor = db.cursor()
+    moved = 0
+    for entry in sorted(os.listdir(EVIDENCE_DIR)):
+        path = os.path.join(EVIDENCE_DIR, entry)
+        if not os.path.isfile(path) or entry.endswith(".tmp"):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"  skipped {entry}, not an image")
+            continue
+        name = store_evidence(data, os.path.splitext(entry)[1] or ".jpg", img)
+        cursor.execute("UPDATE Violations SET evidence_image = %s WHERE evidence_image = %s", (name, entry))
+        db.commit()
+        # only remove the old file once the rows point at the new one
+        os.remove(path)
+        moved += 1
+        print(f"  {entry} -> {name} ({cursor.rowcount} violation(s))")
+    cursor.close()
+    return moved
+
+
+if __name__ == '__main__':
+    import sys
+    from db_pool import ConnectionPool
+
+    if sys.argv[1:] != ["migrate"]:
+        print("usage: python evidence_store.py migrate")
+        sys.exit(1)
+
+    pool = ConnectionPool(size=1)
+    db = pool.get_connection()
+    try:
+        print(f"Moved {migrate_legacy(db)} legacy evidence file(s) into {EVIDENCE_DIR}/")
+    finally:
+        db.close()
+        pool.close_all()
@@ -0,0 +1,28 @@
+import argparse
+from detection_config import HELMET_IMGSZ, HELMET_WEIGHTS, PLATE_IMGSZ, PLATE_WEIGHTS
+from model_backends import export_model
+
+
+# Convert the helmet and plate models for a CPU inference backend, then start inference_server.py with
+# INFERENCE_BACKEND (and INFERENCE_INT8=1 for the quantized copies) set to match.
+#
+#   python export_models.py --backend onnx
+#   python export_models.py --backend onnx --int8 --calib-dir Media
+#   python export_models.py --backend openvino --int8 --data calibration.yaml
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the YOLO models for ONNX Runtime or OpenVINO")
+    parser.add_argument("--backend", choices=["onnx", "openvino"], required=True)
+    parser.add_argument("--int8", action="store_true", help="also quantize the weights to INT8")
+    parser.add_argument("--data", help="dataset yaml used to calibrate OpenVINO INT8 quantization")
+    parser.add_argument("--calib-dir", default="Media", help="images used to calibrate ONNX INT8 quantization")
+    parser.add_argument("--calib-images", type=int, default=100, help="max calibration images for ONNX INT8")
+    parser.add_argument("--helmet-imgsz", type=int, default=HELMET_IMGSZ)
+    parser.add_argument("--plate-imgsz", type=int, default=PLATE_IMGSZ)
+    args = parser.parse_args()
+
+    for weights, imgsz in ((HELMET_WEIGHTS, args.helmet_imgsz), (PLATE_WEIGHTS, args.plate_imgsz)):
+        print(f"Exporting {weights} for {args.backend}{' (int8)' if args.int8 else ''} at {imgsz}px...")
+        path = export_model(weights, args.backend, imgsz=imgsz, int8=args.int8, data=args.data,
+                            calib_dir=args.calib_dir, calib_images=args.calib_images)
+        print(f"  -> {path}")
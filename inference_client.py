@@ -0,0 +1,37 @@
+import os
+import requests
+from metrics import INFERENCE_CALLS
+
+
+# talks to inference_server.py, keeps the ML stack out of the API process
+INFERENCE_URL = os.environ.get("INFERENCE_URL", "http://127.0.0.1:5001")
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", 120))
+
+
+class InferenceUnavailable(Exception):
+    pass
+
+
+# one session per process so the connection to the inference service is reused
+_session = requests.Session()
+
+
+def _call(method, path, **kwargs):
+    try:
+        with INFERENCE_CALLS.time(path):
+            response = _session.request(method, f"{INFERENCE_URL}{path}", timeout=INFERENCE_TIMEOUT, **kwargs)
+    except requests.exceptions.RequestException as e:
+        raise InferenceUnavailable(f"Inference service unreachable at {INFERENCE_URL}: {e}")
+    if response.status_code != 200:
+        raise InferenceUnavailable(f"Inference service error ({response.status_code}): {response.text}")
+    return response.json()
+
+
+# uploads is a list of (filename, raw bytes), returns the per image results from the inference service
+def detect_images(uploads):
+    files = [('image_files', (filename, contents)) for filename, contents in uploads]
+    return _call("POST", "/detect", files=files)["results"]
+
+
+def get_ocr_cache_stats():
+    return _call("GET", "/ocr-cache-stats")
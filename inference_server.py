@@ -0,0 +1,86 @@
+import os
+from flask import Flask, request, jsonify
+from detection_config import INFERENCE_BACKEND, INFERENCE_THREADS
+import metrics
+
+
+# Long lived inference process, holds the YOLO models and EasyOCR in memory.
+# The API (app.py) sends uploads here over localhost and does the database work itself,
+# so API workers start fast and dont carry the ML stack.
+#
+#   python inference_server.py                        one process, requests take turns on the models
+#   INFERENCE_WORKERS=4 python inference_server.py    four worker processes (see prefork.py)
+#
+# With several workers the PyTorch models and EasyOCR are loaded once in the parent before the fork,
+# so the workers share the weights copy-on-write. ONNX Runtime and OpenVINO start their thread pools
+# when the model is loaded and those do not survive a fork, so with those backends every worker loads its own.
+# Each worker gets cpu_count / workers intra-op threads (or INFERENCE_THREADS), for every backend: torch takes the
+# limit directly, the ONNX Runtime session / OpenVINO compiled model is built with it when the worker loads the model.
+# Every worker runs a warmup inference before it accepts connections.
+
+INFERENCE_HOST = os.environ.get("INFERENCE_HOST", "127.0.0.1")
+INFERENCE_PORT = int(os.environ.get("INFERENCE_PORT", 5001))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+INFERENCE_WARMUP = os.environ.get("INFERENCE_WARMUP", "1") == "1"
+
+app = Flask(__name__)
+# request, model inference and evidence write metrics on GET /metrics
+metrics.instrument_app(app)
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({"status": "ok"}), 200
+
+
+# send the images as 'image_files' (multipart), results come back per image in upload order
+@app.route('/detect', methods=['POST'])
+def detect():
+    files = [f for f in request.files.getlist('image_files') if f.filename != '']
+    if not files:
+        return jsonify({"error": "No image files provided"}), 400
+
+    from detection import analyze_uploads
+    try:
+        results = analyze_uploads([(f.filename, f.read()) for f in files])
+        return jsonify({"results": results}), 200
+    except Exception as e:
+        print(f"Error in /detect: {str(e)}")
+        return jsonify({"error": f"Inference failed: {str(e)}"}), 500
+
+
+# plate OCR cache counters, to see whether the cache is sized right
+@app.route('/ocr-cache-stats', methods=['GET'])
+def ocr_cache_stats():
+    from detection import ocr_cache
+    return jsonify(ocr_cache.get_stats()), 200
+
+
+# per worker setup after the fork: thread limits, the models if they could not be shared, warmup
+def init_worker(n):
+    import cv2
+    from model_backends import set_inference_threads
+    from prefork import threads_per_worker
+
+    threads = threads_per_worker(INFERENCE_WORKERS, INFERENCE_THREADS)
+    # before detection is imported, onnx / openvino models are loaded with this limit
+    set_inference_threads(threads)
+    cv2.setNumThreads(threads)
+    import detection
+    if INFERENCE_WARMUP:
+        detection.warmup()
+
+
+if __name__ == '__main__':
+    # bound to localhost only, this service has no authentication of its own
+    if INFERENCE_WORKERS > 1:
+        from prefork import serve
+
+        if INFERENCE_BACKEND == "pytorch":
+            import detection  # loaded before the fork, shared by every worker
+        serve(app, INFERENCE_HOST, INFERENCE_PORT, INFERENCE_WORKERS, worker_init=init_worker)
+    else:
+        import detection
+        if INFERENCE_WARMUP:
+            detection.warmup()
+        app.run(host=INFERENCE_HOST, port=INFERENCE_PORT, threaded=True)
@@ -1,6 +1,22 @@
-import requests
-import time
+import argparse
+import bisect
+import json
 import random
+import string
+import threading
+import time
+import uuid
+import requests
+
+# IoT radar gun simulator and load generator for /iot/report-speeding
+#
+#   python iot_radar_gun.py                                   one device, a report every ~10 s (the old simulator)
+#   python iot_radar_gun.py --devices 50 --rate 500 --duration 60
+#   python iot_radar_gun.py --devices 20 --rate 100 --batch 25 --duration 60 --json results.json
+#
+# Every device is a thread with its own keep-alive session. Requests are sent on a fixed schedule
+# (--rate is the total over all devices), so a slow server shows up as latency and late sends instead
+# of silently lowering the request rate. Latency is measured from the scheduled send time.
 
 # The API endpoint wher its sent
 API_ENDPOINT = "http://localhost:5000/iot/report-speeding"
@@ -8,50 +24,205 @@ API_ENDPOINT = "http://localhost:5000/iot/report-speeding"
 # The secret key to authenticate with the server
 API_KEY = "my-secret-iot-key"
 
-# A list of sample license plates to simulate
-SAMPLE_PLATES = [
-    "RJ10AB1234",  
-    "TH25A0465",   
-    "KA01XY5678",  
-    "DL05PQ9999",  
-    "MH20VV1234"   
-]
+STATE_CODES = ["RJ", "TH", "KA", "DL", "MH", "TN", "UP", "GJ", "WB", "AP", "KL", "HR", "PB", "MP"]
 
 headers = {
     'Content-Type': 'application/json',
     'X-API-Key': API_KEY
 }
 
-print(" IoT Radar Gun Simulator ")
 
-while True:
-    try:
-        plate = random.choice(SAMPLE_PLATES)
-        
-        speed = random.randint(100, 140) 
-        
-        #Create the data payload
-        payload = {
-            "LicensePlate": plate,
-            "Speed": speed
-        }
-        
-        print(f"\n[!] Detected speeding: {plate} at {speed} km/h. Sending report...")
-        
-        #Send the data to Flask server
-        response = requests.post(API_ENDPOINT, json=payload, headers=headers)
-        
-        if response.status_code == 201:
-            print(f"[+] Server accepted report. (201)")
+# a large population of plates, with Zipf weights so a few repeat offenders get most of the reports
+class PlatePopulation:
+
+    def __init__(self, size=100000, skew=1.1, seed=42):
+        rng = random.Random(seed)
+        plates = set()
+        while len(plates) < size:
+            plates.add(f"{rng.choice(STATE_CODES)}{rng.randint(1, 99):02d}"
+                       f"{''.join(rng.choices(string.ascii_uppercase, k=2))}{rng.randint(0, 9999):04d}")
+        self.plates = sorted(plates)
+        rng.shuffle(self.plates)
+        total = 0.0
+        self.cum_weights = []
+        for rank in range(1, size + 1):
+            total += 1.0 / rank ** skew
+            self.cum_weights.append(total)
+
+    def pick(self, rng):
+        i = bisect.bisect_left(self.cum_weights, rng.random() * self.cum_weights[-1])
+        return self.plates[min(i, len(self.plates) - 1)]
+
+
+class Results:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+        self.readings = 0
+        self.late = 0
+        self.finished = None
+
+    def add(self, latency, status, readings, late):
+        with self.lock:
+            self.finished = time.perf_counter()
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.readings += readings
+            self.late += late
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+def run_device(device_id, args, population, results, start, stop):
+    rng = random.Random(f"{args.seed}-{device_id}")
+    session = requests.Session()
+    session.headers.update(headers)
+    interval = args.devices / args.rate
+    # spread the devices over the first interval so they dont all fire together
+    next_send = start + interval * device_id / args.devices
+    name = f"IoT-Radar-{device_id + 1:02d}"
+
+    while not stop.is_set():
+        if args.duration and next_send >= start + args.duration:
+            break
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            if stop.wait(delay):
+                break
+        late = 1 if delay < -interval else 0
+
+        if args.batch > 1:
+            url = API_ENDPOINT + "/batch"
+            payload = {"DeviceID": name, "Readings": [{
+                "IdempotencyKey": uuid.uuid4().hex,
+                "LicensePlate": population.pick(rng),
+                "Speed": rng.randint(100, 140),
+                "Timestamp": time.time(),
+            } for _ in range(args.batch)]}
         else:
-            print(f"[-] Server rejected report. (Code: {response.status_code}, Msg: {response.text})")
-            
-        #Wait for a random time before detecting the next car
-        time.sleep(random.randint(5, 15))
-
-    except requests.exceptions.ConnectionError:
-        print("\n[ERROR] Connection refused. Is the Flask server (app.py) running?")
-        time.sleep(10)
+            url = API_ENDPOINT
+            payload = {"LicensePlate": population.pick(rng), "Speed": rng.randint(100, 140)}
+
+        try:
+            response = session.post(url, json=payload, timeout=args.timeout)
+            status = response.status_code
+        except requests.exceptions.ConnectionError:
+            status = "connection_error"
+        except requests.exceptions.Timeout:
+            status = "timeout"
+        # anything else (a response cut off or garbled under overload) is counted too instead of ending the device
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - next_send
+        results.add(latency, status, args.batch, late)
+
+        if args.verbose:
+            plate = payload.get("LicensePlate") or f"{args.batch} readings"
+            print(f"[{name}] {plate}: {status} in {latency * 1000:.1f} ms")
+        next_send += interval
+    session.close()
+
+
+def report(results, elapsed, args):
+    latencies = sorted(results.latencies)
+    requests_done = len(latencies)
+    summary = {
+        "devices": args.devices,
+        "target_rate": args.rate,
+        "batch": args.batch,
+        "elapsed_s": round(elapsed, 2),
+        "requests": requests_done,
+        "readings": results.readings,
+        "throughput_rps": round(requests_done / elapsed, 2) if elapsed else 0.0,
+        "readings_per_s": round(results.readings / elapsed, 2) if elapsed else 0.0,
+        "late_sends": results.late,
+        "statuses": {str(k): v for k, v in results.statuses.items()},
+        "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 2) for p in (50, 90, 95, 99)},
+    }
+    summary["latency_ms"]["max"] = round(latencies[-1] * 1000, 2) if latencies else 0.0
+
+    print("\n--- Load test results ---")
+    print(f"{requests_done} requests ({results.readings} readings) in {elapsed:.1f} s: "
+          f"{summary['throughput_rps']} req/s, {summary['readings_per_s']} readings/s (target {args.rate} req/s)")
+    print(f"Status codes: {summary['statuses']}")
+    if results.late:
+        print(f"{results.late} requests were sent more than one interval late, the generator or the server could not keep up")
+    print("Latency (ms): " + ", ".join(f"{k} {v}" for k, v in summary["latency_ms"].items()))
+
+    # log2 buckets from 1 ms up
+    if latencies:
+        print("Latency histogram:")
+        bucket_counts = {}
+        for latency in latencies:
+            bound = 1
+            while latency * 1000 > bound:
+                bound *= 2
+            bucket_counts[bound] = bucket_counts.get(bound, 0) + 1
+        widest = max(bucket_counts.values())
+        for bound in sorted(bucket_counts):
+            count = bucket_counts[bound]
+            print(f"  <= {bound:>6} ms {count:>8}  {'#' * max(1, int(40 * count / widest))}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Saved results to {args.json}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="IoT radar gun simulator / load generator for /iot/report-speeding")
+    parser.add_argument("--devices", type=int, default=1, help="simulated radar guns, one thread each")
+    parser.add_argument("--rate", type=float, default=0.1, help="target requests per second over all devices")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run, 0 runs until Ctrl+C")
+    parser.add_argument("--batch", type=int, default=1, help="readings per request, above 1 uses /iot/report-speeding/batch")
+    parser.add_argument("--plates", type=int, default=100000, help="size of the generated plate population")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent, higher means more repeat offenders")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=10, help="request timeout in seconds")
+    parser.add_argument("--url", default=API_ENDPOINT)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="print every request")
+    args = parser.parse_args()
+    if args.devices < 1 or args.rate <= 0 or args.batch < 1:
+        parser.error("--devices and --batch must be at least 1 and --rate above 0")
+
+    API_ENDPOINT = args.url
+    # the plain simulator prints every report like it always did
+    if args.devices == 1 and args.rate <= 1:
+        args.verbose = True
+
+    print(" IoT Radar Gun Simulator ")
+    print(f"Generating {args.plates} plates (skew {args.skew})...")
+    population = PlatePopulation(args.plates, args.skew, args.seed)
+    print(f"{args.devices} device(s), {args.rate} req/s, {args.batch} reading(s) per request, "
+          f"{'until Ctrl+C' if not args.duration else f'{args.duration:.0f} s'}")
+
+    results = Results()
+    stop = threading.Event()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_device, args=(n, args, population, results, start, stop), daemon=True)
+               for n in range(args.devices)]
+    for t in threads:
+        t.start()
+
+    last_progress = start
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(0.2)
+            if not args.verbose and time.perf_counter() - last_progress >= 5:
+                last_progress = time.perf_counter()
+                print(f"  {last_progress - start:6.1f} s  {len(results.latencies)} requests  {results.statuses}")
     except KeyboardInterrupt:
         print("\n--- Simulator stopped ---")
-        break
\ No newline at end of file
+        stop.set()
+    for t in threads:
+        t.join(args.timeout)
+
+    report(results, (results.finished or time.perf_counter()) - start, args)
@@ -0,0 +1,172 @@
+import json
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    pass
+
+
+# job state kept in this process, fine while one process serves every request
+class MemoryJobStore:
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def update(self, job_id, fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    # forget finished jobs older than cutoff
+    def purge(self, cutoff):
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+# job state in a MySQL table (AutodetectJobs, migrations/0007) so every worker process sees every job,
+# the job still runs in the process that accepted it, only its status and result are shared
+class MySQLJobStore:
+
+    def __init__(self, pool, table="AutodetectJobs"):
+        self.pool = pool
+        self.table = table
+
+    def _run(self, sql, params, fetch=False):
+        db = self.pool.get_connection()
+        try:
+            cursor = db.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            row = cursor.fetchone() if fetch else None
+            db.commit()
+            cursor.close()
+            return row
+        finally:
+            db.close()
+
+    def add(self, job):
+        self._run(f"INSERT INTO {self.table} (JobID, Status, SubmittedAt) VALUES (%s, %s, %s)",
+                  (job["job_id"], job["status"], job["submitted_at"]))
+
+    def update(self, job_id, fields):
+        columns = {"status": "Status", "finished_at": "FinishedAt", "result": "Result", "error": "Error"}
+        values = {columns[k]: (json.dumps(v) if k == "result" and v is not None else v) for k, v in fields.items()}
+        assignments = ", ".join(f"{column} = %s" for column in values)
+        self._run(f"UPDATE {self.table} SET {assignments} WHERE JobID = %s", (*values.values(), job_id))
+
+    def get(self, job_id):
+        row = self._run(f"SELECT JobID, Status, SubmittedAt, FinishedAt, Result, Error FROM {self.table} WHERE JobID = %s",
+                        (job_id,), fetch=True)
+        if not row:
+            return None
+        return {
+            "job_id": row["JobID"],
+            "status": row["Status"],
+            "submitted_at": row["SubmittedAt"],
+            "finished_at": row["FinishedAt"],
+            "result": json.loads(row["Result"]) if row["Result"] is not None else None,
+            "error": row["Error"],
+        }
+
+    def delete(self, job_id):
+        self._run(f"DELETE FROM {self.table} WHERE JobID = %s", (job_id,))
+
+    # also drops jobs that never finished because their worker process went away
+    def purge(self, cutoff):
+        self._run(f"DELETE FROM {self.table} WHERE FinishedAt < %s OR (FinishedAt IS NULL AND SubmittedAt < %s)",
+                  (cutoff, cutoff))
+
+
+# bounded job queue served by a fixed pool of worker threads
+# handler(*args) runs in a worker and returns the job result
+# store keeps the job status / result (MemoryJobStore unless given)
+class JobQueue:
+
+    def __init__(self, handler, workers=2, max_depth=100, result_ttl=600, name="jobs", store=None):
+        self.handler = handler
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.name = name
+        self.store = store if store is not None else MemoryJobStore()
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    # workers are started on first submit so importing the app stays cheap
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}-worker-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, *args):
+        self._start_workers()
+        self._purge_finished()
+
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self.store.add(job)
+        try:
+            self._queue.put_nowait((job_id, args))
+        except queue.Full:
+            self.store.delete(job_id)
+            raise QueueFull(f"{self.name} queue is full ({self._queue.maxsize} jobs waiting)")
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            job_id, args = self._queue.get()
+            self._update(job_id, status="running")
+            try:
+                result = self.handler(*args)
+                self._update(job_id, status="done", result=result, finished_at=time.time())
+            except Exception as e:
+                print(f"Error in {self.name} job {job_id}: {e}")
+                self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self._queue.task_done()
+
+    def _update(self, job_id, **fields):
+        try:
+            self.store.update(job_id, fields)
+        except Exception as e:
+            print(f"Error updating {self.name} job {job_id}: {e}")
+
+    # forget finished jobs once nobody has polled them for a while
+    def _purge_finished(self):
+        self.store.purge(time.time() - self.result_ttl)
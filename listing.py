@@ -0,0 +1,202 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+
+
+# helpers for the list endpoints: keyset pagination, field projection and filters
+#
+#   ?limit=50            page size (capped at MAX_PAGE_SIZE)
+#   ?cursor=<id>         return rows after this id, use next_cursor from the previous page
+#   ?fields=a,b,c        only return these columns, the key column is always included
+#   ?count=0             skip the total count query
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 500))
+
+
+class ListingError(ValueError):
+    pass
+
+
+def like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def json_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def parse_fields(args, columns, key):
+    requested = args.get('fields')
+    if not requested:
+        return list(columns)
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        raise ListingError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(columns)}")
+    if key not in fields:
+        fields.insert(0, key)
+    return fields
+
+
+def parse_int(args, name, default=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ListingError(f"{name} must be an integer")
+
+
+# ?status= / ?from= / ?to= shared by the violation listing, lookup and export, checked here so a bad value
+# is a 400 instead of MySQL quietly coercing it, returns (sql condition, params) filters on Violations v
+def parse_violation_filters(args):
+    filters = []
+    status = args.get('status')
+    if status:
+        if status not in ('Unpaid', 'Paid'):
+            raise ListingError("status must be Unpaid or Paid")
+        filters.append(("v.Status = %s", [status]))
+    for arg, condition in (('from', "v.DateTime >= %s"), ('to', "v.DateTime < %s")):
+        if args.get(arg):
+            try:
+                filters.append((condition, [datetime.fromisoformat(str(args[arg]))]))
+            except ValueError:
+                raise ListingError(f"{arg} must be a date or date time (YYYY-MM-DD[ HH:MM:SS])")
+    return filters
+
+
+# one page of rows ordered by the key column
+# columns maps output name -> sql expression, filters is a list of (sql condition, params)
+def keyset_page(cursor, args, from_sql, columns, key, filters):
+    limit = min(max(parse_int(args, 'limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    after = parse_int(args, 'cursor')
+    with_total = args.get('count', '1') != '0'
+    fields = parse_fields(args, columns, key)
+
+    where = [sql for sql, _ in filters]
+    params = [p for _, ps in filters for p in ps]
+
+    total = None
+    if with_total:
+        count_where = f" WHERE {' AND '.join(where)}" if where else ""
+        cursor.execute(f"SELECT COUNT(*) FROM {from_sql}{count_where}", params)
+        total = cursor.fetchone()[0]
+
+    if after is not None:
+        where.append(f"{columns[key]} > %s")
+        params.append(after)
+    page_where = f" WHERE {' AND '.join(where)}" if where else ""
+    select = ", ".join(f"{columns[f]} AS {f}" for f in fields)
+
+    # one extra row tells us whether there is another page
+    cursor.execute(f"SELECT {select} FROM {from_sql}{page_where} ORDER BY {columns[key]} LIMIT %s", params + [limit + 1])
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [{f: json_value(v) for f, v in zip(fields, row)} for row in rows]
+    return {
+        "items": items,
+        "next_cursor": items[-1][key] if has_more else None,
+        "total": total,
+    }
+
+
+# columns the vehicle and violation listings can return (?fields=)
+VEHICLE_COLUMNS = {
+    "VehicleID": "VehicleID",
+    "OwnerName": "OwnerName",
+    "LicensePlate": "LicensePlate",
+    "VehicleType": "VehicleType",
+    "Contact": "Contact",
+    "Address": "Address",
+    "RegisteredBy": "RegisteredBy",
+}
+
+VIOLATION_COLUMNS = {
+    "ViolationID": "v.ViolationID",
+    "VehicleID": "v.VehicleID",
+    "LicensePlate": "ve.LicensePlate",
+    "DateTime": "v.DateTime",
+    "ViolationType": "v.ViolationType",
+    "FineAmount": "v.FineAmount",
+    "Status": "v.Status",
+    "Location": "v.Location",
+    "ReportedBy": "v.ReportedBy",
+    "evidence_image": "v.evidence_image",
+    # thumbs/<name>.jpg for content addressed evidence, see evidence_store.thumbnail_name
+    "evidence_thumbnail": "IF(LOCATE('/', v.evidence_image) > 0, CONCAT('thumbs/', SUBSTRING_INDEX(v.evidence_image, '.', 1), '.jpg'), NULL)",
+}
+
+VIOLATIONS_FROM = "Violations v JOIN Vehicle ve ON ve.VehicleID = v.VehicleID"
+
+
+# violations of one or many plates in a single query, Vehicle LEFT JOIN Violations
+# so a known vehicle without violations still comes back (with ViolationID NULL)
+# filters go in the join condition, they narrow the violations and not the vehicles
+PLATE_VIOLATION_FIELDS = ["ViolationID", "VehicleID", "DateTime", "ViolationType", "FineAmount", "Status",
+                          "Location", "evidence_image", "evidence_thumbnail"]
+
+
+def query_plate_violations(cursor, plates, filters):
+    columns = dict(VIOLATION_COLUMNS, VehicleID="ve.VehicleID")
+    select = ", ".join(f"{columns[f]} AS {f}" for f in PLATE_VIOLATION_FIELDS)
+    join = "".join(f" AND {sql}" for sql, _ in filters)
+    params = [p for _, ps in filters for p in ps] + list(plates)
+    cursor.execute(f"SELECT ve.LicensePlate AS LicensePlate, {select} "
+                   f"FROM Vehicle ve LEFT JOIN Violations v ON v.VehicleID = ve.VehicleID{join} "
+                   f"WHERE ve.LicensePlate IN ({', '.join(['%s'] * len(plates))}) "
+                   f"ORDER BY ve.LicensePlate, v.DateTime, v.ViolationID", params)
+
+
+# rows from query_plate_violations (dictionary cursor) -> (plate, vehicle id, [violation dicts]) per plate
+def group_plate_violations(rows):
+    plate = vehicle_id = None
+    violations = []
+    for row in rows:
+        if row["LicensePlate"] != plate:
+            if plate is not None:
+                yield plate, vehicle_id, violations
+            plate, vehicle_id, violations = row["LicensePlate"], row["VehicleID"], []
+        if row["ViolationID"] is not None:
+            violations.append({f: json_value(row[f]) for f in PLATE_VIOLATION_FIELDS})
+    if plate is not None:
+        yield plate, vehicle_id, violations
+
+
+# every violation joined with its vehicle and payments for /violations/export, one row per payment
+# filters is a list of (sql condition, params) on the v / ve / f aliases
+EXPORT_COLUMNS = [
+    ("ViolationID", "v.ViolationID"),
+    ("DateTime", "v.DateTime"),
+    ("ViolationType", "v.ViolationType"),
+    ("FineAmount", "v.FineAmount"),
+    ("Status", "v.Status"),
+    ("Location", "v.Location"),
+    ("ReportedBy", "v.ReportedBy"),
+    ("evidence_image", "v.evidence_image"),
+    ("VehicleID", "ve.VehicleID"),
+    ("LicensePlate", "ve.LicensePlate"),
+    ("OwnerName", "ve.OwnerName"),
+    ("VehicleType", "ve.VehicleType"),
+    ("FineID", "f.FineID"),
+    ("PaymentStatus", "f.PaymentStatus"),
+    ("PaymentMethod", "f.PaymentMethod"),
+    ("DatePaid", "f.DatePaid"),
+    ("AmountPaid", "f.Amount"),
+]
+
+
+def query_export(cursor, filters):
+    where = " AND ".join(sql for sql, _ in filters)
+    params = [p for _, ps in filters for p in ps]
+    cursor.execute(f"SELECT {', '.join(sql for _, sql in EXPORT_COLUMNS)} "
+                   f"FROM {VIOLATIONS_FROM} LEFT JOIN Fines f ON f.ViolationID = v.ViolationID"
+                   f"{' WHERE ' + where if where else ''} "
+                   f"ORDER BY v.ViolationID, f.FineID", params)
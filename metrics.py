@@ -0,0 +1,215 @@
+import bisect
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+
+# Small in-process metrics registry, served in the Prometheus text format on /metrics.
+# No extra dependency: counters and histograms are a dict and a lock each, an observation is
+# a bisect plus a couple of additions, cheap enough to leave on in production.
+# Every process (API, inference service) serves its own numbers, scrape both.
+#
+# METRICS_ENABLED=0 turns every inc / observe into a no-op.
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# seconds, from sub millisecond queries up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *label_values, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labels:
+            items = [((), 0)]
+        for values, count in items:
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {_number(count)}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per bucket counts (+inf last), sum, count]
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, seconds, *label_values):
+        if not METRICS_ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, [list(entry[0]), entry[1], entry[2]]) for values, entry in self._values.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, values)} {count}")
+        return lines
+
+
+# value read when /metrics is scraped, fn returns a number or {label values tuple: number}
+class Gauge:
+
+    def __init__(self, name, help_text, fn, labels=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labels = tuple(labels)
+        _register(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return lines
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, number in items:
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {_number(number)}")
+        return lines
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# metrics shared by the API and the inference service
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+
+MODEL_LATENCY = Histogram("model_inference_seconds", "Time per model call (helmet, plate, ocr)", ("model",))
+MODEL_ITEMS = Counter("model_inference_items_total", "Images or crops passed to each model", ("model",))
+
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Time per SQL statement, labelled by verb and table", ("statement",))
+DB_CONNECTIONS_OPENED = Counter("db_connections_opened_total", "MySQL connections opened by the pool")
+DB_CONNECTIONS_CLOSED = Counter("db_connections_closed_total", "MySQL connections closed by the pool", ("reason",))
+
+EVIDENCE_WRITE = Histogram("evidence_write_seconds", "Time to encode and write one evidence image")
+EVIDENCE_FILES = Counter("evidence_files_total", "Evidence images stored: written, deduplicated or failed", ("result",))
+INFERENCE_CALLS = Histogram("inference_service_request_seconds", "API side time of calls to the inference service", ("path",))
+VIOLATION_FLUSH = Histogram("violation_buffer_flush_seconds", "Time to write one group from the write-behind violation buffer")
+
+
+_STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|JOIN)\s+`?(\w+)", re.IGNORECASE)
+
+
+# low cardinality label for a SQL statement: "select:Vehicle", "insert:Violations", "update:DashboardStats"
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    text = sql.lstrip()
+    verb = text.split(None, 1)[0].lower() if text else "unknown"
+    match = _STATEMENT_TABLE.search(text)
+    return f"{verb}:{match.group(1)}" if match else verb
+
+
+# time every request by its route pattern (not the raw path, so /get-vehicle/<plate> is one series)
+# and serve /metrics on the given flask app
+def instrument_app(app):
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_started = time.perf_counter()
+
+    def _record(status):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - started, request.method, route)
+        HTTP_REQUESTS.inc(request.method, route, str(status))
+
+    @app.after_request
+    def _metrics_response(response):
+        _record(response.status_code)
+        return response
+
+    # a route that raised never reaches after_request
+    @app.teardown_request
+    def _metrics_error(exception=None):
+        _record(500)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,206 @@
+import argparse
+import glob
+import os
+import re
+import mysql.connector
+from db_pool import DB_CONFIG
+from listing import (keyset_page, query_export, query_plate_violations, VEHICLE_COLUMNS, VIOLATION_COLUMNS,
+                     VIOLATIONS_FROM)
+
+
+# Versioned schema migrations.
+# Every file in migrations/ is named NNNN_description.sql and runs once, in order.
+# Applied versions are recorded in the SchemaVersion table.
+#
+#   python migrate.py            apply pending migrations
+#   python migrate.py status     show applied / pending migrations
+#   python migrate.py check      EXPLAIN the API queries and report full table scans
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def load_migrations():
+    migrations = []
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+        name = os.path.basename(path)
+        match = re.match(r"^(\d+)_(.+)\.sql$", name)
+        if not match:
+            raise ValueError(f"Bad migration file name: {name} (expected NNNN_description.sql)")
+        migrations.append((int(match.group(1)), name, path))
+
+    versions = [v for v, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Two migrations share the same version number")
+    return migrations
+
+
+# split a migration file into statements, comments are dropped
+# (our migrations dont put ';' inside string literals)
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def table_exists(cursor, table):
+    cursor.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_version_table(cursor):
+    if table_exists(cursor, "SchemaVersion"):
+        return
+    cursor.execute("""
+        CREATE TABLE SchemaVersion (
+            Version INT PRIMARY KEY,
+            Name VARCHAR(255) NOT NULL,
+            AppliedAt DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # databases created from the old one-shot TrafficDB.sql already have the early tables,
+    # mark those migrations as applied instead of running them again
+    baseline = 0
+    if table_exists(cursor, "Vehicle"):
+        baseline = 2 if table_exists(cursor, "DashboardStats") else 1
+    for version, name, _ in load_migrations():
+        if version <= baseline:
+            cursor.execute("INSERT INTO SchemaVersion (Version, Name) VALUES (%s, %s)", (version, name))
+            print(f"  baseline: {name} already present, marked as applied")
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT Version FROM SchemaVersion")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(db):
+    cursor = db.cursor()
+    ensure_version_table(cursor)
+    db.commit()
+
+    done = applied_versions(cursor)
+    pending = [m for m in load_migrations() if m[0] not in done]
+    if not pending:
+        print("Schema is up to date.")
+    for version, name, path in pending:
+        print(f"Applying {name}...")
+        with open(path) as f:
+            statements = split_statements(f.read())
+        # MySQL commits DDL implicitly, so a failed migration can leave earlier statements applied.
+        # The version is only recorded when every statement went through.
+        for stmt in statements:
+            cursor.execute(stmt)
+        cursor.execute("INSERT INTO SchemaVersion (Version, Name) VALUES (%s, %s)", (version, name))
+        db.commit()
+    cursor.close()
+    return len(pending)
+
+
+def status(db):
+    cursor = db.cursor()
+    ensure_version_table(cursor)
+    db.commit()
+    done = applied_versions(cursor)
+    for version, name, _ in load_migrations():
+        print(f"  [{'x' if version in done else ' '}] {name}")
+    cursor.close()
+
+
+# stands in for a cursor so the query builders the routes use (listing.py) can be run without
+# a database, check() then EXPLAINs exactly the SQL they send
+class RecordingCursor:
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+
+    def fetchone(self):
+        return (0,)
+
+    def fetchall(self):
+        return []
+
+
+def recorded(label, build):
+    cursor = RecordingCursor()
+    build(cursor)
+    if len(cursor.statements) == 1:
+        return [(label, *cursor.statements[0])]
+    return [(f"{label} #{n}", sql, params) for n, (sql, params) in enumerate(cursor.statements, 1)]
+
+
+# keyset listing: the total count and the page after cursor 100
+def listing_queries(label, from_sql, columns, key, filters):
+    return recorded(label, lambda cursor: keyset_page(cursor, {"cursor": "100"}, from_sql, columns, key, filters))
+
+
+# the queries the API runs on its hot paths, with sample parameters (None = no placeholders).
+# fixed statements are copied from the routes, the listing / lookup / export SQL is built by the same code the routes call
+HOT_QUERIES = [
+    ("login", "SELECT password, role FROM loginuser WHERE username = %s", ("devAdmin",)),
+    ("profile: violations reported", "SELECT COUNT(*) FROM Violations WHERE ReportedBy = %s", ("devAdmin",)),
+    ("profile: vehicles registered", "SELECT COUNT(*) FROM Vehicle WHERE RegisteredBy = %s", ("devAdmin",)),
+    ("vehicle by plate", "SELECT * FROM Vehicle WHERE LicensePlate = %s", ("KA01AB1234",)),
+    ("delete vehicle: its violations", "SELECT ViolationID, ReportedBy FROM Violations WHERE VehicleID = %s", (1,)),
+    ("violation by id", "SELECT ViolationID, FineAmount, Status FROM Violations WHERE ViolationID = %s", (1,)),
+    ("pay fine", "SELECT v.FineAmount, ve.LicensePlate FROM Violations v JOIN Vehicle ve ON ve.VehicleID = v.VehicleID "
+                 "WHERE v.ViolationID = %s", (1,)),
+    ("vehicles by plates", "SELECT LicensePlate, VehicleID FROM Vehicle WHERE LicensePlate IN (%s, %s)", ("KA01AB1234", "DL05PQ9999")),
+    ("idempotency keys", "SELECT IdempotencyKey, ViolationID FROM Violations WHERE ReportedBy = %s AND IdempotencyKey IN (%s, %s)", ("IoT-Radar-01", "a", "b")),
+    ("unknown owner sequence", "UPDATE UnknownOwnerSequence SET NextValue = LAST_INSERT_ID(NextValue + %s) WHERE SeqID = 1", (20,)),
+    ("dashboard summary", "SELECT TotalVehicles, TotalViolations, TotalPaid, TotalUnpaid FROM DashboardStats WHERE StatsID = 1", None),
+]
+HOT_QUERIES += recorded("violations of a plate", lambda cursor: query_plate_violations(cursor, ["KA01AB1234"], []))
+HOT_QUERIES += recorded("violations by plates", lambda cursor: query_plate_violations(
+    cursor, ["DL05PQ9999", "KA01AB1234"], [("v.DateTime >= %s", ["2024-01-01"])]))
+HOT_QUERIES += recorded("violations export", lambda cursor: query_export(cursor, [("v.Status = %s", ["Unpaid"])]))
+HOT_QUERIES += listing_queries("vehicles page by registrar", "Vehicle", VEHICLE_COLUMNS, "VehicleID",
+                               [("RegisteredBy = %s", ["devAdmin"])])
+HOT_QUERIES += listing_queries("vehicles page by plate prefix", "Vehicle", VEHICLE_COLUMNS, "VehicleID",
+                               [("LicensePlate LIKE %s", ["KA01%"])])
+for label, condition, value in (("status", "v.Status = %s", "Unpaid"), ("type", "v.ViolationType = %s", "Speeding"),
+                                ("plate", "ve.LicensePlate = %s", "KA01AB1234"), ("reporter", "v.ReportedBy = %s", "devAdmin"),
+                                ("date", "v.DateTime >= %s", "2024-01-01")):
+    HOT_QUERIES += listing_queries(f"violations page by {label}", VIOLATIONS_FROM, VIOLATION_COLUMNS, "ViolationID",
+                                   [(condition, [value])])
+
+
+def check(db):
+    cursor = db.cursor(dictionary=True)
+    problems = 0
+    for label, sql, params in HOT_QUERIES:
+        cursor.execute("EXPLAIN " + sql, params)
+        for row in cursor.fetchall():
+            if row["type"] != "ALL":
+                continue
+            problems += 1
+            if row["possible_keys"]:
+                # an index exists but the optimizer preferred a scan, usually because the table is still small
+                print(f"  SCAN  {label}: full scan of {row['table']} (~{row['rows']} rows), index {row['possible_keys']} not chosen")
+            else:
+                print(f"  SCAN  {label}: full scan of {row['table']} (~{row['rows']} rows), no usable index")
+    cursor.close()
+    if problems:
+        print(f"{problems} full table scan(s) in {len(HOT_QUERIES)} queries.")
+    else:
+        print(f"All {len(HOT_QUERIES)} queries use an index.")
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply and inspect TrafficDB schema migrations")
+    parser.add_argument("command", nargs="?", default="migrate", choices=["migrate", "status", "check"])
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        if args.command == "migrate":
+            migrate(db)
+        elif args.command == "status":
+            status(db)
+        else:
+            raise SystemExit(1 if check(db) else 0)
+    finally:
+        db.close()
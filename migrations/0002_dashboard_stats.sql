@@ -0,0 +1,23 @@
+-- dashboard counters, kept up to date by the app (see dashboard_stats.py)
+CREATE TABLE DashboardStats (
+    StatsID TINYINT PRIMARY KEY,
+    TotalVehicles INT NOT NULL DEFAULT 0,
+    TotalViolations INT NOT NULL DEFAULT 0,
+    TotalPaid DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    TotalUnpaid DECIMAL(14, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE ViolationTypeCounts (
+    ViolationType VARCHAR(255) PRIMARY KEY,
+    ViolationCount INT NOT NULL DEFAULT 0
+);
+
+INSERT INTO DashboardStats (StatsID, TotalVehicles, TotalViolations, TotalPaid, TotalUnpaid)
+SELECT 1,
+       (SELECT COUNT(*) FROM Vehicle),
+       (SELECT COUNT(*) FROM Violations),
+       (SELECT COALESCE(SUM(FineAmount), 0) FROM Violations WHERE Status = 'Paid'),
+       (SELECT COALESCE(SUM(FineAmount), 0) FROM Violations WHERE Status = 'Unpaid');
+
+INSERT INTO ViolationTypeCounts (ViolationType, ViolationCount)
+SELECT ViolationType, COUNT(*) FROM Violations WHERE ViolationType IS NOT NULL GROUP BY ViolationType;
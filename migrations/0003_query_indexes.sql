@@ -0,0 +1,19 @@
+-- indexes for the columns the API filters and aggregates on
+
+-- /my-profile-stats counts and /violations?reported_by=
+CREATE INDEX idx_violations_reportedby ON Violations (ReportedBy);
+
+-- /violations?status= (keyset on ViolationID) and the paid / unpaid sums in dashboard reconcile
+CREATE INDEX idx_violations_status_fine ON Violations (Status, FineAmount);
+
+-- /violations?type= and the GROUP BY ViolationType in dashboard reconcile
+CREATE INDEX idx_violations_type ON Violations (ViolationType);
+
+-- date range filters on violation listings
+CREATE INDEX idx_violations_datetime ON Violations (DateTime);
+
+-- /my-profile-stats counts and /get-vehicles?registered_by=
+CREATE INDEX idx_vehicle_registeredby ON Vehicle (RegisteredBy);
+
+-- auto-registration LIKE 'UNKNOWN (%' prefix lookup
+CREATE INDEX idx_vehicle_ownername ON Vehicle (OwnerName);
@@ -0,0 +1,11 @@
+-- numbers for auto-registered owners ("UNKNOWN (n) (Auto-Detected)"), handed out by vehicle_registry.py
+-- instead of counting the existing UNKNOWN rows on every insert
+CREATE TABLE UnknownOwnerSequence (
+    SeqID TINYINT PRIMARY KEY,
+    NextValue BIGINT NOT NULL
+);
+
+-- continue after the highest number already in use
+INSERT INTO UnknownOwnerSequence (SeqID, NextValue)
+SELECT 1, COALESCE(MAX(CAST(SUBSTRING(SUBSTRING_INDEX(OwnerName, ')', 1), 10) AS UNSIGNED)), 0) + 1
+FROM Vehicle WHERE OwnerName LIKE 'UNKNOWN (%';
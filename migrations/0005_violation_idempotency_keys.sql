@@ -0,0 +1,5 @@
+-- device generated idempotency keys for IoT readings, a retried reading finds its violation instead of adding another
+ALTER TABLE Violations ADD COLUMN IdempotencyKey VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin NULL;
+
+-- keys are unique per device (ReportedBy), rows without a key are not affected
+CREATE UNIQUE INDEX uq_violations_idempotency ON Violations (ReportedBy, IdempotencyKey);
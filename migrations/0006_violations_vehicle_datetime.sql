@@ -0,0 +1,3 @@
+-- per vehicle violation lookups (/get-violations, /violations/lookup) read a vehicle's violations in date order
+-- and filter them by date range, this also serves the VehicleID foreign key
+CREATE INDEX idx_violations_vehicle_datetime ON Violations (VehicleID, DateTime);
@@ -0,0 +1,12 @@
+-- async autodetect job status / results, shared by every API worker process (API_WORKERS > 1)
+CREATE TABLE AutodetectJobs (
+    JobID CHAR(36) CHARACTER SET ascii NOT NULL PRIMARY KEY,
+    Status VARCHAR(16) NOT NULL,
+    SubmittedAt DOUBLE NOT NULL,
+    FinishedAt DOUBLE NULL,
+    Result MEDIUMTEXT NULL,
+    Error TEXT NULL
+);
+
+-- finished jobs are purged by age
+CREATE INDEX idx_autodetect_jobs_finished ON AutodetectJobs (FinishedAt);
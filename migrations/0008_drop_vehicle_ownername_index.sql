@@ -0,0 +1,4 @@
+-- auto-registration numbers owners from UnknownOwnerSequence (0004) instead of the LIKE 'UNKNOWN (%' prefix
+-- lookup this index served, and /get-vehicles?owner matches anywhere in the name (LIKE '%...%') so it cannot
+-- use it either, it only costs every vehicle insert and update
+DROP INDEX idx_vehicle_ownername ON Vehicle;
@@ -0,0 +1,188 @@
+import glob
+import os
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+
+# Where each backend keeps its exported copy of a .pt model.
+# Ultralytics writes exports next to the weights file, we keep the same layout:
+#   Weights/best.pt -> Weights/best.onnx, Weights/best.int8.onnx,
+#                      Weights/best_openvino_model/, Weights/best_int8_openvino_model/
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+
+def exported_model_path(pt_path, backend, int8=False):
+    stem = os.path.splitext(pt_path)[0]
+    if backend == "pytorch":
+        return pt_path
+    if backend == "onnx":
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+# intra-op thread limit for models loaded from now on, 0 keeps the library default (all cores).
+# pytorch takes it at any time, onnxruntime and openvino only when the session / compiled model is built
+_inference_threads = 0
+
+
+def set_inference_threads(threads):
+    global _inference_threads
+    if threads <= 0:
+        return
+    _inference_threads = threads
+    import torch
+    torch.set_num_threads(threads)
+
+
+def load_model(pt_path, backend="pytorch", int8=False):
+    path = exported_model_path(pt_path, backend, int8)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, run: python export_models.py --backend {backend}" + (" --int8" if int8 else ""))
+    # exported models dont carry the task, so tell ultralytics its a detector
+    model = YOLO(path, task="detect")
+    if backend != "pytorch" and _inference_threads > 0:
+        limit_backend_threads(model, backend, path, _inference_threads)
+    return model
+
+
+# ultralytics creates the onnxruntime session / openvino compiled model itself, without thread options,
+# so let it set up its backend on a tiny image and swap in one built with the thread limit
+def limit_backend_threads(model, backend, path, threads):
+    model.predict(np.zeros((32, 32, 3), dtype=np.uint8), verbose=False)
+    backend_model = model.predictor.model
+
+    if backend == "onnx":
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        providers = backend_model.session.get_providers()
+        backend_model.session = onnxruntime.InferenceSession(path, sess_options=options, providers=providers)
+
+    elif backend == "openvino":
+        import openvino as ov
+        core = ov.Core()
+        xml = glob.glob(os.path.join(path, "*.xml"))[0]
+        config = {"PERFORMANCE_HINT": "LATENCY", "INFERENCE_NUM_THREADS": threads}
+        backend_model.ov_compiled_model = core.compile_model(core.read_model(xml), "CPU", config)
+
+    print(f"{path}: {backend} limited to {threads} intra-op thread(s)")
+
+
+# calibration batches for static INT8 quantization: sample images letterboxed to the model input
+# the same way ultralytics feeds them (RGB, CHW, 0-1, grey padding)
+class CalibrationImages:
+
+    def __init__(self, input_name, image_dir, imgsz, limit=100):
+        paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.png")))[:limit]
+        if not paths:
+            raise FileNotFoundError(f"No calibration images (*.jpg / *.png) in {image_dir}")
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._paths = iter(paths)
+
+    def _prepare(self, img):
+        h, w = img.shape[:2]
+        scale = self.imgsz / max(h, w)
+        resized = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        top = (self.imgsz - resized.shape[0]) // 2
+        left = (self.imgsz - resized.shape[1]) // 2
+        canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+        return (canvas[:, :, ::-1].transpose(2, 0, 1)[None] / 255.0).astype(np.float32)
+
+    # called by onnxruntime until it returns None
+    def get_next(self):
+        for path in self._paths:
+            img = cv2.imread(path)
+            if img is not None:
+                return {self.input_name: self._prepare(img)}
+        return None
+
+
+# convert one .pt model for the given backend, returns the exported path
+# exports are dynamic so batches and different input sizes keep working
+# onnx INT8 calibrates on up to calib_images pictures from calib_dir, openvino INT8 on the dataset yaml in data
+def export_model(pt_path, backend, imgsz=640, int8=False, data=None, calib_dir="Media", calib_images=100):
+    model = YOLO(pt_path)
+
+    if backend == "onnx":
+        onnx_path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if not int8:
+            return onnx_path
+        # static QDQ quantization, weights and activations calibrated on sample images.
+        # dynamic quantization would turn the convolutions into ConvInteger, which onnxruntime
+        # runs slower on CPU than the FP32 model
+        import onnxruntime
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+        input_name = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        int8_path = exported_model_path(pt_path, "onnx", int8=True)
+        quantize_static(onnx_path, int8_path, CalibrationImages(input_name, calib_dir, imgsz, calib_images),
+                        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        per_channel=True)
+        return int8_path
+
+    if backend == "openvino":
+        # openvino INT8 is post training quantization, it calibrates on the dataset yaml in data
+        kwargs = {"data": data} if int8 and data else {}
+        return model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, **kwargs)
+
+    raise ValueError(f"Nothing to export for backend: {backend}")
+
+
+# boxes and classes the backends agree on, ref/test are ultralytics results for the same image
+def detections_match(ref, test, min_iou=0.8, conf_tolerance=0.1):
+    ref_boxes = ref.boxes.xyxy.cpu().numpy()
+    test_boxes = test.boxes.xyxy.cpu().numpy()
+    if len(ref_boxes) != len(test_boxes):
+        return False, f"{len(ref_boxes)} vs {len(test_boxes)} boxes"
+    if len(ref_boxes) == 0:
+        return True, "no boxes"
+
+    ref_cls = ref.boxes.cls.cpu().numpy()
+    test_cls = test.boxes.cls.cpu().numpy()
+    ref_conf = ref.boxes.conf.cpu().numpy()
+    test_conf = test.boxes.conf.cpu().numpy()
+
+    # IoU matrix, every reference box against every test box
+    x1 = np.maximum(ref_boxes[:, None, 0], test_boxes[None, :, 0])
+    y1 = np.maximum(ref_boxes[:, None, 1], test_boxes[None, :, 1])
+    x2 = np.minimum(ref_boxes[:, None, 2], test_boxes[None, :, 2])
+    y2 = np.minimum(ref_boxes[:, None, 3], test_boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    ref_area = (ref_boxes[:, 2] - ref_boxes[:, 0]) * (ref_boxes[:, 3] - ref_boxes[:, 1])
+    test_area = (test_boxes[:, 2] - test_boxes[:, 0]) * (test_boxes[:, 3] - test_boxes[:, 1])
+    iou = inter / np.maximum(ref_area[:, None] + test_area[None, :] - inter, 1e-6)
+    iou[ref_cls[:, None] != test_cls[None, :]] = 0
+
+    best = iou.argmax(axis=1)
+    best_iou = iou[np.arange(len(best)), best]
+    if best_iou.min() < min_iou:
+        return False, f"box IoU {best_iou.min():.2f} below {min_iou}"
+    conf_diff = np.abs(ref_conf - test_conf[best]).max()
+    if conf_diff > conf_tolerance:
+        return False, f"confidence differs by {conf_diff:.2f}"
+    return True, f"min IoU {best_iou.min():.2f}"
+
+
+# run the PyTorch and the exported model on a few sample images and compare their detections
+def verify_backend(pt_path, model, sample_dir="Media", samples=4, min_iou=0.8, conf_tolerance=0.1, **predict_args):
+    images = sorted(glob.glob(os.path.join(sample_dir, "*.jpg")) + glob.glob(os.path.join(sample_dir, "*.png")))[:samples]
+    images = [img for img in (cv2.imread(p) for p in images) if img is not None]
+    if not images:
+        print(f"No sample images in {sample_dir}, skipping backend check for {pt_path}")
+        return True
+
+    reference = YOLO(pt_path)
+    for i, img in enumerate(images):
+        ref = reference(img, verbose=False, **predict_args)[0]
+        test = model(img, verbose=False, **predict_args)[0]
+        ok, detail = detections_match(ref, test, min_iou=min_iou, conf_tolerance=conf_tolerance)
+        if not ok:
+            print(f"Backend check FAILED for {pt_path} on sample {i}: {detail}")
+            return False
+    print(f"Backend check passed for {pt_path} on {len(images)} sample image(s)")
+    return True
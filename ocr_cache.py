@@ -0,0 +1,63 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# exact content key of a plate crop: shape + every pixel
+# a perceptual hash (tried before) maps different plates onto the same bits, plates differ in a
+# couple of characters while re-captures of one plate differ more than that, so no fuzzy match is safe.
+# only byte identical crops share an entry, in practice the same image uploaded again (a retried upload, a
+# re-sent file), decoded video frames and burst shots always differ a little and never hit
+def plate_key(plate_crop):
+    crop = np.ascontiguousarray(plate_crop)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{crop.shape}:{crop.dtype}".encode())
+    digest.update(crop.data)
+    return digest.hexdigest()
+
+
+# bounded LRU + TTL cache of OCR results keyed by the crops content key
+class PlateOCRCache:
+
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (plate text, stored at)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        if self.max_size <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                text, stored_at = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return text
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, text):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (text, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,179 @@
+import atexit
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from socketserver import ThreadingMixIn
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+
+# Pre-fork production server for the flask services, no extra dependency.
+# The parent binds the port, loads whatever should be shared (the models) and forks the workers,
+# every worker serves the shared listening socket with a threaded werkzeug server.
+# Memory loaded before the fork is shared copy-on-write, so N workers do not hold N copies of the weights.
+# Workers that die are started again. SIGTERM / Ctrl+C stops them all: each worker stops accepting, waits up to
+# WORKER_DRAIN_TIMEOUT for the requests it is handling to finish, then exits (which drains the buffers).
+#
+# Linux / macOS only (os.fork).
+
+WORKER_RESTART_DELAY = float(os.environ.get("WORKER_RESTART_DELAY", 1.0))
+WORKER_DRAIN_TIMEOUT = float(os.environ.get("WORKER_DRAIN_TIMEOUT", 30))
+
+
+def _stop_worker(signum, frame):
+    sys.exit(0)
+
+
+# keep-alive connections waiting for their next request are idle, a draining worker closes them
+# instead of waiting for the client, and closes every connection after the request it is serving
+class DrainingHandler(WSGIRequestHandler):
+
+    def handle_one_request(self):
+        with self.server.lock:
+            if self.server.draining:
+                self.close_connection = True
+                return
+            self.server.idle.add(self.connection)
+        try:
+            super().handle_one_request()
+        finally:
+            with self.server.lock:
+                self.server.idle.discard(self.connection)
+            if self.server.draining:
+                self.close_connection = True
+
+    # the request line has arrived, the connection is busy from here on
+    def parse_request(self):
+        with self.server.lock:
+            self.server.idle.discard(self.connection)
+        return super().parse_request()
+
+
+# werkzeug's threaded server uses daemon request threads, they would be killed mid-request when the worker exits
+class DrainingServer(ThreadedWSGIServer):
+
+    daemon_threads = False
+
+    def __init__(self, host, port, app, fd=None):
+        self.lock = threading.Lock()
+        self.idle = set()
+        self.draining = False
+        super().__init__(host, port, app, handler=DrainingHandler, fd=fd)
+
+    # werkzeug's serve_forever() closes the server on its way out, which would join the request threads
+    # without a timeout, only the socket is closed here and drain() does the waiting
+    def server_close(self):
+        super(ThreadingMixIn, self).server_close()
+
+    # after serve_forever() has returned: give the requests in flight until the timeout to finish,
+    # returns how many are still running
+    def drain(self, timeout):
+        with self.lock:
+            self.draining = True
+            idle = list(self.idle)
+        for connection in idle:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        threads = list(self._threads)
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        return sum(1 for t in threads if t.is_alive())
+
+
+def _run_worker(n, host, port, app, fd):
+    server = DrainingServer(host, port, app, fd=fd)
+
+    # shutdown() waits for serve_forever() to return, so it cannot run in the signal handler on the same thread
+    def stop_worker(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop_worker)
+    signal.signal(signal.SIGINT, stop_worker)
+    print(f"Worker {n} (pid {os.getpid()}) serving on http://{host}:{port}")
+    server.serve_forever()
+    left = server.drain(WORKER_DRAIN_TIMEOUT)
+    if not left:
+        # leaves through the normal interpreter exit so atexit handlers (evidence writer, buffers) run
+        sys.exit(0)
+    # the interpreter would wait for the stuck request threads forever, run the atexit drains and leave without them
+    print(f"Worker {n}: {left} request(s) still running after {WORKER_DRAIN_TIMEOUT}s, exiting anyway")
+    atexit._run_exitfuncs()
+    sys.stdout.flush()
+    os._exit(0)
+
+
+# worker_init(n) runs in each worker after the fork and before it accepts connections
+# (thread limits, per process state, warmup), returns when every worker has exited
+def serve(app, host, port, workers, worker_init=None, backlog=128):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+
+    # keep the garbage collector off everything loaded so far, its bookkeeping writes
+    # would otherwise copy the shared pages into every worker
+    gc.collect()
+    gc.freeze()
+
+    children = {}  # pid -> worker number
+    started = {}  # worker number -> start time
+    stopping = []
+
+    def spawn(n):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, _stop_worker)
+            signal.signal(signal.SIGINT, _stop_worker)
+            if worker_init is not None:
+                worker_init(n)
+            _run_worker(n, host, port, app, sock.fileno())
+        children[pid] = n
+        started[n] = time.monotonic()
+
+    def stop(signum, frame):
+        if not stopping:
+            print(f"Stopping {len(children)} worker(s)...")
+            stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Starting {workers} worker(s) on http://{host}:{port} (parent pid {os.getpid()})")
+    for n in range(workers):
+        spawn(n)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        n = children.pop(pid, None)
+        if n is None or stopping:
+            continue
+        print(f"Worker {n} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        # a worker that keeps crashing on boot should not turn into a fork loop
+        if time.monotonic() - started[n] < 5:
+            time.sleep(WORKER_RESTART_DELAY)
+            if stopping:
+                continue
+        spawn(n)
+    sock.close()
+
+
+# intra-op threads per worker so the workers together use each core once
+def threads_per_worker(workers, configured=0):
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from metrics import Counter, Gauge
+
+
+# Read-through cache for the hot read routes (/get-vehicle, /get-violations, /get-violation, /my-profile-stats).
+# Routes ask for a response body by key and only go to MySQL on a miss, successful (200) bodies are cached.
+# Every write path drops exactly the keys it changed, after its commit:
+#
+#   vehicle:<PLATE>      /get-vehicle/<plate>          register / delete vehicle
+#   violations:<PLATE>   /get-violations/<plate>       any violation added for the plate, fine paid, vehicle deleted
+#   violation:<id>       /get-violation/<id>           fine paid, vehicle deleted
+#   profile:<username>   /my-profile-stats             violations reported by the user, their vehicles deleted
+#
+# A load that started before an invalidation of its key is not stored, so a slow reader cannot put back
+# what a writer just dropped. The cache is per process and invalidations only reach the worker that made the
+# write, so with several API workers (API_WORKERS > 1) a paid fine would show as unpaid on the others for a whole
+# TTL. There the cache is off by default, and READ_CACHE_BACKEND=memory is held to READ_CACHE_WORKER_TTL.
+# Writes from other processes (video_ingest.py) are seen once the TTL passes.
+#
+# READ_CACHE_BACKEND picks the store: memory (LRU + TTL in this process) or none (always miss).
+
+API_WORKERS = int(os.environ.get("API_WORKERS", 0))
+READ_CACHE_BACKEND = os.environ.get("READ_CACHE_BACKEND", "none" if API_WORKERS > 1 else "memory")
+READ_CACHE_SIZE = int(os.environ.get("READ_CACHE_SIZE", 5000))
+READ_CACHE_TTL = float(os.environ.get("READ_CACHE_TTL", 60))
+# longest a worker may serve a response another worker has already changed
+READ_CACHE_WORKER_TTL = float(os.environ.get("READ_CACHE_WORKER_TTL", 2))
+if API_WORKERS > 1 and READ_CACHE_TTL > READ_CACHE_WORKER_TTL:
+    if READ_CACHE_BACKEND == "memory":
+        print(f"Read cache: {API_WORKERS} API workers do not share invalidations, TTL lowered to {READ_CACHE_WORKER_TTL}s")
+    READ_CACHE_TTL = READ_CACHE_WORKER_TTL
+
+CACHE_LOOKUPS = Counter("read_cache_lookups_total", "Read cache lookups by key type and result (hit, miss)", ("kind", "result"))
+CACHE_INVALIDATIONS = Counter("read_cache_invalidations_total", "Read cache keys dropped by writes", ("kind",))
+
+
+# bounded LRU + TTL store, same shape as the other in-process caches
+class MemoryBackend:
+
+    def __init__(self, max_size=READ_CACHE_SIZE, ttl=READ_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, stored at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class NullBackend:
+
+    evictions = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def size(self):
+        return 0
+
+
+BACKENDS = {"memory": MemoryBackend, "none": NullBackend}
+
+
+def _kind(key):
+    return key.split(":", 1)[0]
+
+
+class ReadCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated = OrderedDict()  # key -> generation it was last invalidated at
+        self.stats = {}  # kind -> {"hits", "misses", "invalidations"}
+
+    def _count(self, kind, name):
+        with self._lock:
+            counts = self.stats.setdefault(kind, {"hits": 0, "misses": 0, "invalidations": 0})
+            counts[name] += 1
+
+    # cached (body, 200) for the key, or load() -> (body, status) and cache it when status is 200
+    def response(self, key, load):
+        kind = _kind(key)
+        body = self.backend.get(key)
+        if body is not None:
+            self._count(kind, "hits")
+            CACHE_LOOKUPS.inc(kind, "hit")
+            return body, 200
+        self._count(kind, "misses")
+        CACHE_LOOKUPS.inc(kind, "miss")
+
+        with self._lock:
+            started = self._generation
+        body, status = load()
+        if status == 200:
+            with self._lock:
+                stale = self._invalidated.get(key, -1) > started
+            if not stale:
+                self.backend.set(key, body)
+        return body, status
+
+    # drop keys after the write that changed them is committed, None keys are ignored
+    def invalidate(self, *keys):
+        for key in keys:
+            if key is None:
+                continue
+            with self._lock:
+                self._generation += 1
+                self._invalidated[key] = self._generation
+                self._invalidated.move_to_end(key)
+                # only loads still in flight care, old entries can go
+                while len(self._invalidated) > 10000:
+                    self._invalidated.popitem(last=False)
+            self.backend.delete(key)
+            self._count(_kind(key), "invalidations")
+            CACHE_INVALIDATIONS.inc(_kind(key))
+
+    def get_stats(self):
+        with self._lock:
+            by_kind = {kind: dict(counts) for kind, counts in self.stats.items()}
+        for counts in by_kind.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_ratio"] = round(counts["hits"] / lookups, 4) if lookups else 0.0
+        hits = sum(c["hits"] for c in by_kind.values())
+        lookups = hits + sum(c["misses"] for c in by_kind.values())
+        return {
+            "backend": READ_CACHE_BACKEND,
+            "size": self.backend.size(),
+            "evictions": self.backend.evictions,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "by_kind": by_kind,
+        }
+
+
+def create_cache():
+    if READ_CACHE_BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown READ_CACHE_BACKEND: {READ_CACHE_BACKEND} (expected {' or '.join(BACKENDS)})")
+    return ReadCache(BACKENDS[READ_CACHE_BACKEND]())
+
+
+# plates compare case-insensitively in MySQL, so "ka01ab1234" and "KA01AB1234" share an entry
+def vehicle_key(plate):
+    return f"vehicle:{str(plate).upper()}"
+
+
+def violations_key(plate):
+    return f"violations:{str(plate).upper()}"
+
+
+def violation_key(violation_id):
+    return f"violation:{int(violation_id)}"
+
+
+def profile_key(username):
+    return f"profile:{username}" if username else None
+
+
+cache = create_cache()
+Gauge("read_cache_entries", "Entries in the read cache", cache.backend.size)
+
+
+# keys changed by new violations, records are (plate, reported_by) pairs
+def violations_added(records):
+    keys = set()
+    for plate, reported_by in records:
+        keys.add(violations_key(plate))
+        keys.add(profile_key(reported_by))
+    cache.invalidate(*sorted(k for k in keys if k))
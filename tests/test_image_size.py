@@ -0,0 +1,38 @@
+import os
+import sys
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# detection loads the models on import, skipped where the ML stack is not installed
+detection = pytest.importorskip("detection")
+
+
+def encode(ext, width, height, params=()):
+    img = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    ok, data = cv2.imencode(ext, img, list(params))
+    assert ok
+    return data.tobytes()
+
+
+@pytest.mark.parametrize("ext, params", [
+    (".jpg", ()),
+    (".jpg", (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)),
+    (".png", ()),
+])
+def test_size_read_from_the_header(ext, params):
+    assert detection.image_size(encode(ext, 321, 123, params)) == (321, 123)
+
+
+def test_exif_segment_before_the_frame_header():
+    jpeg = encode(".jpg", 64, 48)
+    exif = b"Exif\x00\x00" + b"\x00" * 200
+    with_app1 = jpeg[:2] + b"\xff\xe1" + (len(exif) + 2).to_bytes(2, "big") + exif + jpeg[2:]
+    assert detection.image_size(with_app1) == (64, 48)
+
+
+@pytest.mark.parametrize("data", [b"", b"GIF89a" + b"\x00" * 20, b"\xff\xd8\xff\xe0\x00", b"\xff\xd8" + b"\x00" * 20])
+def test_unknown_or_truncated_data_has_no_size(data):
+    assert detection.image_size(data) is None
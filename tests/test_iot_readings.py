@@ -0,0 +1,80 @@
+import os
+import sys
+from datetime import datetime, timezone
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import violation_store
+from app import parse_reading
+
+
+def reading(**overrides):
+    values = {"IdempotencyKey": "r-1", "LicensePlate": "KA01AB1234", "Speed": 120, "Timestamp": 1700000000}
+    values.update(overrides)
+    return values
+
+
+def test_reading_is_parsed():
+    parsed = parse_reading(reading())
+    assert parsed == {"key": "r-1", "plate": "KA01AB1234", "fine": 300, "time": datetime.fromtimestamp(1700000000)}
+
+
+def test_iso_timestamps_are_stored_as_local_time():
+    parsed = parse_reading(reading(Timestamp="2023-11-14T22:13:20Z"))
+    assert parsed["time"] == datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+@pytest.mark.parametrize("bad", [
+    "not a reading",
+    reading(IdempotencyKey=None),
+    reading(IdempotencyKey="x" * 65),
+    reading(IdempotencyKey="clé"),
+    reading(Speed="fast"),
+    reading(Speed=True),
+    reading(Timestamp="yesterday"),
+    reading(Timestamp=True),
+    reading(Timestamp=1e20),
+])
+def test_bad_readings_are_rejected(bad):
+    with pytest.raises(ValueError):
+        parse_reading(bad)
+
+
+# Violations rows keyed by (ReportedBy, IdempotencyKey), enough for record_device_violations
+class ViolationsCursor:
+
+    def __init__(self):
+        self.rows = {}
+        self.inserts = 0
+
+    def execute(self, sql, params):
+        if sql.startswith("SELECT IdempotencyKey"):
+            reported_by, keys = params[0], params[1:]
+            self.result = [(key, self.rows[(reported_by, key)]) for key in keys if (reported_by, key) in self.rows]
+        else:
+            self.inserts += 1
+            for i in range(0, len(params), 7):
+                self.rows[(params[i + 5], params[i + 6])] = len(self.rows) + 1
+
+    def fetchall(self):
+        return self.result
+
+
+def test_resent_batch_returns_the_stored_violations(monkeypatch):
+    monkeypatch.setattr(violation_store.registry, "resolve_many",
+                        lambda cursor, plates, vehicle_type: {plate: 7 for plate in plates})
+    monkeypatch.setattr(violation_store.dashboard_stats, "record_violation_added", lambda *args, **kwargs: None)
+    cursor = ViolationsCursor()
+    readings = [parse_reading(reading(IdempotencyKey=f"r-{i}")) for i in range(3)]
+
+    first = violation_store.record_device_violations(cursor, "radar-1", "Speeding", readings[:2], "MG Road")
+    assert first == {"r-0": (1, True), "r-1": (2, True)}
+
+    again = violation_store.record_device_violations(cursor, "radar-1", "Speeding", readings, "MG Road")
+    assert again == {"r-0": (1, False), "r-1": (2, False), "r-2": (3, True)}
+    assert cursor.inserts == 2
+
+    # the same key from another device is a different reading
+    other = violation_store.record_device_violations(cursor, "radar-2", "Speeding", readings[:1], "MG Road")
+    assert other == {"r-0": (4, True)}
@@ -0,0 +1,86 @@
+import os
+import sys
+from datetime import datetime
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from listing import ListingError, keyset_page, parse_violation_filters, VEHICLE_COLUMNS
+
+
+# serves a table of rows ordered by id the way the page query asks for them (id > cursor, LIMIT n)
+class TableCursor:
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, list(params)))
+        if sql.startswith("SELECT COUNT(*)"):
+            self.result = [(len(self.ids),)]
+            return
+        after = params[-2] if "VehicleID > %s" in sql else 0
+        columns = sql[len("SELECT "):sql.index(" FROM")].split(", ")
+        self.result = [tuple(i if c.startswith("VehicleID") else f"row {i}" for c in columns)
+                       for i in self.ids if i > after][:params[-1]]
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+def page(cursor, args):
+    return keyset_page(cursor, args, "Vehicle", VEHICLE_COLUMNS, "VehicleID", [("RegisteredBy = %s", ["bob"])])
+
+
+def test_pages_follow_the_cursor_to_the_end():
+    cursor = TableCursor(list(range(1, 8)))
+    seen = []
+    args = {"limit": "3"}
+    while True:
+        result = page(cursor, args)
+        seen += [item["VehicleID"] for item in result["items"]]
+        if result["next_cursor"] is None:
+            break
+        args = {"limit": "3", "cursor": str(result["next_cursor"]), "count": "0"}
+    assert seen == list(range(1, 8))
+    assert result["total"] is None
+
+
+def test_first_page_counts_and_keeps_the_filters():
+    cursor = TableCursor([4, 9, 12])
+    result = page(cursor, {"limit": "2"})
+    assert result["total"] == 3
+    assert result["next_cursor"] == 9
+    count_sql, count_params = cursor.statements[0]
+    assert "WHERE RegisteredBy = %s" in count_sql and count_params == ["bob"]
+    page_sql, page_params = cursor.statements[1]
+    assert page_sql.endswith("ORDER BY VehicleID LIMIT %s") and page_params == ["bob", 3]
+
+
+def test_fields_always_include_the_key():
+    cursor = TableCursor([1])
+    result = page(cursor, {"fields": "LicensePlate"})
+    assert set(result["items"][0]) == {"VehicleID", "LicensePlate"}
+
+
+@pytest.mark.parametrize("args", [{"fields": "Password"}, {"cursor": "abc"}, {"limit": "ten"}])
+def test_bad_paging_arguments_are_rejected(args):
+    with pytest.raises(ListingError):
+        page(TableCursor([1]), args)
+
+
+def test_violation_filters():
+    filters = parse_violation_filters({"status": "Paid", "from": "2024-01-01", "to": "2024-02-01 12:30:00"})
+    assert filters == [("v.Status = %s", ["Paid"]), ("v.DateTime >= %s", [datetime(2024, 1, 1)]),
+                       ("v.DateTime < %s", [datetime(2024, 2, 1, 12, 30)])]
+    assert parse_violation_filters({}) == []
+
+
+@pytest.mark.parametrize("args", [{"status": "paid"}, {"from": "garbage"}, {"to": "2024-13-01"}])
+def test_bad_violation_filters_are_rejected(args):
+    with pytest.raises(ListingError):
+        parse_violation_filters(args)
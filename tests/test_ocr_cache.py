@@ -0,0 +1,84 @@
+import os
+import random
+import string
+import sys
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_cache import PlateOCRCache, plate_key
+
+
+def plate_text(rng):
+    return f"KA{rng.randint(1, 99):02d}{''.join(rng.choices(string.ascii_uppercase, k=2))}{rng.randint(0, 9999):04d}"
+
+
+def render(text):
+    img = np.full((60, 260, 3), 235, np.uint8)
+    cv2.rectangle(img, (2, 2), (257, 57), (0, 0, 0), 2)
+    cv2.putText(img, text, (10, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (10, 10, 10), 3)
+    return img
+
+
+# the same plate shot again: a bit of scale, shift, brightness and jpeg noise
+def recapture(img, rng):
+    h, w = img.shape[:2]
+    s = rng.uniform(0.9, 1.1)
+    m = np.float32([[s, 0, rng.uniform(-2, 2)], [0, s, rng.uniform(-2, 2)]])
+    out = cv2.warpAffine(img, m, (int(w * s), int(h * s)), borderValue=(235, 235, 235))
+    out = cv2.convertScaleAbs(out, alpha=rng.uniform(0.85, 1.15), beta=rng.uniform(-15, 15))
+    ok, enc = cv2.imencode(".jpg", out, [cv2.IMWRITE_JPEG_QUALITY, rng.randint(60, 90)])
+    return cv2.imdecode(enc, cv2.IMREAD_COLOR)
+
+
+def distinct_plates(rng, n, exclude=()):
+    texts = []
+    seen = set(exclude)
+    while len(texts) < n:
+        text = plate_text(rng)
+        if text not in seen:
+            seen.add(text)
+            texts.append(text)
+    return texts
+
+
+def test_distinct_plates_never_share_an_entry():
+    rng = random.Random(1)
+    cache = PlateOCRCache(max_size=2000, ttl=3600)
+    cached = distinct_plates(rng, 1000)
+    for text in cached:
+        cache.put(plate_key(render(text)), text)
+
+    for text in distinct_plates(rng, 200, exclude=cached):
+        assert cache.get(plate_key(render(text))) is None
+        assert cache.get(plate_key(recapture(render(text), rng))) is None
+    assert cache.get_stats()["hits"] == 0
+
+
+def test_identical_crop_hits():
+    cache = PlateOCRCache()
+    img = render("KA01AB1234")
+    cache.put(plate_key(img), "KA01AB1234")
+    assert cache.get(plate_key(img.copy())) == "KA01AB1234"
+    # a crop taken as a view of the frame keys the same as a copy of it
+    frame = np.zeros((200, 400, 3), np.uint8)
+    frame[50:110, 70:330] = img
+    assert cache.get(plate_key(frame[50:110, 70:330])) == "KA01AB1234"
+
+
+def test_same_pixels_different_shape_do_not_collide():
+    flat = np.arange(60 * 260 * 3, dtype=np.uint8)
+    assert plate_key(flat.reshape(60, 260, 3)) != plate_key(flat.reshape(260, 60, 3))
+
+
+def test_expired_and_evicted_entries_miss():
+    cache = PlateOCRCache(max_size=2, ttl=-1)
+    cache.put("a", "A")
+    assert cache.get("a") is None
+    cache = PlateOCRCache(max_size=2, ttl=3600)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+    assert cache.get_stats()["evictions"] == 1
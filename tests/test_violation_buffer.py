@@ -0,0 +1,170 @@
+import os
+import sys
+import threading
+import time
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import violation_buffer
+from violation_buffer import BufferFull, FlushFailed, ViolationBuffer
+
+
+def record(plate):
+    return {"plate": plate, "reported_by": "cam-01"}
+
+
+# the buffer with its database write replaced, groups containing a plate in bad fail as a whole
+class StubBuffer(ViolationBuffer):
+
+    def __init__(self, bad=(), **kwargs):
+        super().__init__(pool=None, **kwargs)
+        self.bad = set(bad)
+        self.writes = []
+        self.written = []
+
+    def _write(self, records):
+        plates = [r["plate"] for r in records]
+        self.writes.append(plates)
+        for plate in plates:
+            if plate in self.bad:
+                raise ValueError(f"bad plate {plate}")
+        self.written.extend(plates)
+
+
+class StubCursor:
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        return StubCursor()
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        self.log.append("close")
+
+
+class StubPool:
+
+    def __init__(self):
+        self.log = []
+
+    def get_connection(self):
+        return StubConnection(self.log)
+
+
+def test_concurrent_adds_share_one_group():
+    buffer = StubBuffer(flush_size=4, flush_interval=60, durability="commit")
+    threads = [threading.Thread(target=buffer.add, args=([record(f"KA0{i}")],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(buffer.writes) == 1
+    assert sorted(buffer.writes[0]) == ["KA00", "KA01", "KA02", "KA03"]
+    assert buffer.get_stats()["flushes"] == 1
+
+
+def test_partial_group_is_flushed_after_the_interval():
+    buffer = StubBuffer(flush_size=100, flush_interval=0.05, durability="commit")
+    started = time.monotonic()
+    buffer.add([record("KA01"), record("KA02")])
+    assert time.monotonic() - started >= 0.04
+    assert buffer.writes == [["KA01", "KA02"]]
+
+
+def test_failed_group_is_retried_per_record():
+    buffer = StubBuffer(bad={"BAD1"}, flush_size=3, flush_interval=60, durability="commit")
+    with pytest.raises(FlushFailed) as failure:
+        buffer.add([record("KA01"), record("BAD1"), record("KA02")])
+    # the positions are the ones in the add() call, the others were committed one by one
+    assert list(failure.value.failed) == [1]
+    assert "BAD1" in failure.value.failed[1]
+    assert buffer.written == ["KA01", "KA02"]
+    stats = buffer.get_stats()
+    assert (stats["flushed"], stats["failed"]) == (2, 1)
+
+
+def test_failures_map_to_the_caller_that_added_them():
+    buffer = StubBuffer(bad={"BAD1"}, flush_size=4, flush_interval=60, durability="commit")
+    outcomes = {}
+
+    def add(name, records):
+        try:
+            buffer.add(records)
+            outcomes[name] = None
+        except FlushFailed as e:
+            outcomes[name] = e.failed
+
+    first = threading.Thread(target=add, args=("first", [record("KA01"), record("KA02")]))
+    first.start()
+    while buffer.depth() < 2:
+        time.sleep(0.001)
+    second = threading.Thread(target=add, args=("second", [record("KA03"), record("BAD1")]))
+    second.start()
+    first.join(5)
+    second.join(5)
+    assert outcomes["first"] is None
+    assert list(outcomes["second"]) == [1]
+
+
+def test_async_add_returns_before_the_flush():
+    buffer = StubBuffer(flush_size=100, flush_interval=60, durability="async")
+    buffer.add([record("KA01")])
+    assert buffer.writes == []
+    assert buffer.depth() == 1
+    buffer.drain(timeout=5)
+
+
+def test_drain_flushes_what_is_buffered_and_stops_adds():
+    buffer = StubBuffer(flush_size=100, flush_interval=60, durability="async")
+    for i in range(5):
+        buffer.add([record(f"KA0{i}")])
+    buffer.drain(timeout=5)
+    assert buffer.written == [f"KA0{i}" for i in range(5)]
+    assert buffer.depth() == 0
+    with pytest.raises(BufferFull):
+        buffer.add([record("KA09")])
+
+
+def test_full_buffer_rejects_the_whole_add():
+    buffer = StubBuffer(flush_size=100, flush_interval=60, max_depth=3, durability="async")
+    buffer.add([record("KA01"), record("KA02")])
+    with pytest.raises(BufferFull):
+        buffer.add([record("KA03"), record("KA04")])
+    assert buffer.depth() == 2
+    assert buffer.get_stats()["rejected"] == 2
+    buffer.drain(timeout=5)
+    assert buffer.written == ["KA01", "KA02"]
+
+
+def test_write_commits_and_rolls_back_on_the_pool_connection(monkeypatch):
+    calls = []
+
+    def record_violation_group(cursor, records):
+        calls.append([r["plate"] for r in records])
+        if any(r["plate"] == "BAD1" for r in records):
+            raise ValueError("bad plate")
+
+    monkeypatch.setattr(violation_buffer, "record_violation_group", record_violation_group)
+    monkeypatch.setattr(violation_buffer.read_cache, "violations_added", lambda records: None)
+    pool = StubPool()
+    buffer = ViolationBuffer(pool, flush_size=2, flush_interval=60, durability="commit")
+    with pytest.raises(FlushFailed):
+        buffer.add([record("KA01"), record("BAD1")])
+    assert calls == [["KA01", "BAD1"], ["KA01"], ["BAD1"]]
+    # group rolled back, KA01 committed alone, BAD1 rolled back, every connection returned
+    assert pool.log == ["rollback", "close", "commit", "close", "rollback", "close"]
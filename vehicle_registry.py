@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from db_pool import ConnectionPool
+import dashboard_stats
+
+
+# Find the VehicleID for a plate, auto-registering unknown vehicles, shared by the camera and IoT paths.
+#
+#   - plates are compared like the UNIQUE LicensePlate index does (case-insensitively), so they are
+#     stripped and upper-cased once here and the cache is keyed on that
+#   - repeat plates come from a bounded LRU plate -> VehicleID cache and never touch the DB
+#   - a cache miss is one SELECT on the UNIQUE LicensePlate index
+#   - a new plate is one INSERT ... ON DUPLICATE KEY UPDATE, if another request registered it first the
+#     statement returns that vehicle instead, so concurrent reports of the same plate are safe
+#   - owner numbers for "UNKNOWN (n)" come from the UnknownOwnerSequence table, reserved in blocks
+#     on a separate connection so the callers transaction never holds the sequence row lock, a number
+#     taken for a plate that turned out to be registered already is handed out again
+#
+# Only vehicles that were already committed go in the cache, a vehicle created in a
+# transaction that is rolled back later must not be handed out again.
+
+VEHICLE_CACHE_SIZE = int(os.environ.get("VEHICLE_CACHE_SIZE", 10000))
+VEHICLE_CACHE_TTL = float(os.environ.get("VEHICLE_CACHE_TTL", 300))
+UNKNOWN_OWNER_BLOCK = int(os.environ.get("UNKNOWN_OWNER_BLOCK", 20))
+
+
+
+def normalize_plate(plate):
+    return str(plate).strip().upper()
+
+
+class VehicleRegistry:
+
+    def __init__(self, cache_size=VEHICLE_CACHE_SIZE, cache_ttl=VEHICLE_CACHE_TTL, block_size=UNKNOWN_OWNER_BLOCK, pool=None):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.block_size = max(1, block_size)
+        self._pool = pool
+        self._cache = OrderedDict()  # plate -> (vehicle id, stored at)
+        self._lock = threading.Lock()
+        self._numbers = iter(())
+        self._returned = []  # owner numbers taken but not used
+        self._numbers_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "races": 0, "evictions": 0, "sequence_blocks": 0}
+
+    def _cached(self, plate):
+        if self.cache_size <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(plate)
+            if entry is not None:
+                if now - entry[1] <= self.cache_ttl:
+                    self._cache.move_to_end(plate)
+                    self.stats["hits"] += 1
+                    return entry[0]
+                del self._cache[plate]
+            self.stats["misses"] += 1
+            return None
+
+    def _remember(self, plate, vehicle_id):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[plate] = (vehicle_id, time.monotonic())
+            self._cache.move_to_end(plate)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # drop a plate from the cache, call it when the vehicle is deleted
+    def forget(self, plate):
+        with self._lock:
+            self._cache.pop(normalize_plate(plate), None)
+
+    def _lookup(self, cursor, plate):
+        cursor.execute("SELECT VehicleID FROM Vehicle WHERE LicensePlate = %s", (plate,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    # next owner number, reserves a new block of block_size numbers when the current one runs out
+    # numbers left over when the process exits are simply skipped
+    def _next_owner_number(self):
+        with self._numbers_lock:
+            if self._returned:
+                return self._returned.pop()
+            number = next(self._numbers, None)
+            if number is not None:
+                return number
+
+            if self._pool is None:
+                self._pool = ConnectionPool(size=1)
+            db = self._pool.get_connection()
+            try:
+                cursor = db.cursor()
+                cursor.execute("UPDATE UnknownOwnerSequence SET NextValue = LAST_INSERT_ID(NextValue + %s) WHERE SeqID = 1",
+                               (self.block_size,))
+                cursor.execute("SELECT LAST_INSERT_ID()")
+                end = cursor.fetchone()[0]
+                db.commit()
+                cursor.close()
+            finally:
+                db.close()
+            self._count("sequence_blocks")
+            self._numbers = iter(range(end - self.block_size + 1, end))
+            return end - self.block_size
+
+    def _return_owner_number(self, number):
+        with self._numbers_lock:
+            self._returned.append(number)
+
+    # VehicleID for the plate, registering it as an unknown owner if needed, the caller commits
+    def resolve(self, cursor, plate, vehicle_type="UNKNOWN"):
+        plate = normalize_plate(plate)
+        vehicle_id = self._cached(plate)
+        if vehicle_id is not None:
+            return vehicle_id
+
+        vehicle_id = self._lookup(cursor, plate)
+        if vehicle_id is not None:
+            self._remember(plate, vehicle_id)
+            return vehicle_id
+        vehicle_id, created = self._register(cursor, plate, vehicle_type)
+        if created:
+            dashboard_stats.record_vehicle_added(cursor)
+        return vehicle_id
+
+    # same for many plates: cached ones are free, the rest are looked up with one IN query
+    # vehicle_types can give new plates their own type instead of vehicle_type, returns {plate: VehicleID}
+    # keyed on the plates as the caller passed them
+    def resolve_many(self, cursor, plates, vehicle_type="UNKNOWN", vehicle_types=None):
+        normalized = {plate: normalize_plate(plate) for plate in plates}
+        types = {}
+        for plate, type_ in (vehicle_types or {}).items():
+            types.setdefault(normalize_plate(plate), type_)
+
+        vehicle_ids = {}
+        missing = []
+        for plate in dict.fromkeys(normalized.values()):
+            vehicle_id = self._cached(plate)
+            if vehicle_id is None:
+                missing.append(plate)
+            else:
+                vehicle_ids[plate] = vehicle_id
+
+        if missing:
+            placeholders = ", ".join(["%s"] * len(missing))
+            cursor.execute(f"SELECT LicensePlate, VehicleID FROM Vehicle WHERE LicensePlate IN ({placeholders})", missing)
+            for plate, vehicle_id in cursor.fetchall():
+                # the row has the spelling it was registered with, the IN match ignored case
+                vehicle_ids[normalize_plate(plate)] = vehicle_id
+                self._remember(normalize_plate(plate), vehicle_id)
+
+        # new plates are inserted in sorted order and the dashboard row is updated once after them, so concurrent
+        # batches take the Vehicle key locks in the same order and only then the DashboardStats row (no lock cycle)
+        created = 0
+        for plate in sorted(p for p in missing if p not in vehicle_ids):
+            vehicle_ids[plate], was_created = self._register(cursor, plate, types.get(plate, vehicle_type))
+            created += was_created
+        if created:
+            dashboard_stats.record_vehicle_added(cursor, count=created)
+        return {plate: vehicle_ids[normal] for plate, normal in normalized.items()}
+
+    # insert the plate as an unknown owner, returns (VehicleID, created), the caller updates the dashboard counters
+    # a plate registered by a concurrent request in the meantime is not changed, LAST_INSERT_ID(VehicleID) makes the
+    # statement return its id, and the affected rows tell the two apart: 1 inserted, 0 already there (with the
+    # default client flags, CLIENT_FOUND_ROWS would report 1 for both)
+    def _register(self, cursor, plate, vehicle_type):
+        number = self._next_owner_number()
+        owner_name = f"UNKNOWN ({number}) (Auto-Detected)"
+        cursor.execute("""
+            INSERT INTO Vehicle (OwnerName, LicensePlate, VehicleType, Contact, Address)
+            VALUES (%s, %s, %s, 'N/A', 'N/A')
+            ON DUPLICATE KEY UPDATE VehicleID = LAST_INSERT_ID(VehicleID)
+        """, (owner_name, plate, vehicle_type))
+        vehicle_id = cursor.lastrowid
+        if cursor.rowcount != 1:
+            self._count("races")
+            self._return_owner_number(number)
+            self._remember(plate, vehicle_id)
+            return vehicle_id, False
+        self._count("created")
+        print(f"Vehicle {plate} not found, auto-registered with ID: {vehicle_id} and Owner: {owner_name}")
+        return vehicle_id, True
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._cache)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# one registry per process
+registry = VehicleRegistry()
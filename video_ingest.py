@@ -0,0 +1,196 @@
+import argparse
+import os
+import time
+import cv2
+import numpy as np
+from db_pool import ConnectionPool
+from detection import detect_helmet_violations, read_plates_in_frame, save_evidence_image
+from violation_store import record_auto_violation
+
+
+# Video ingestion for camera clips / streams.
+# Samples every Nth frame, follows riders from frame to frame and files
+# one violation per rider + plate instead of one per frame.
+#
+#   python video_ingest.py clip.mp4 --stride 5
+#   python video_ingest.py rtsp://camera-01/stream --location "MG Road Junction"
+#   python video_ingest.py 0            (local webcam)
+
+# seconds of video during which a plate that was filed is not filed again, a rider who stays in view or comes
+# back within it is one violation, and a long running stream does not remember every plate it ever saw
+VIDEO_PLATE_TTL = float(os.environ.get("VIDEO_PLATE_TTL", 600))
+
+
+# IoU between one box and an array of boxes, all as (x1, y1, x2, y2)
+def box_iou(box, boxes):
+    boxes = np.asarray(boxes, dtype=np.float32)
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+# simple IoU tracker, good enough for riders moving a bit between sampled frames
+class RiderTracker:
+
+    def __init__(self, iou_threshold=0.3, max_age=10):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age  # in sampled frames
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, boxes, frame_no):
+        # drop riders we have not seen for a while
+        self.tracks = [t for t in self.tracks if frame_no - t["last_seen"] <= self.max_age]
+
+        matched = []
+        free = list(self.tracks)
+        for box in boxes:
+            track = None
+            if free:
+                ious = box_iou(box, [t["box"] for t in free])
+                best = int(np.argmax(ious))
+                if ious[best] >= self.iou_threshold:
+                    track = free.pop(best)
+
+            if track is None:
+                track = {"id": self._next_id, "plate": None, "ocr_attempts": 0}
+                self._next_id += 1
+                self.tracks.append(track)
+
+            track["box"] = box
+            track["last_seen"] = frame_no
+            matched.append(track)
+        return matched
+
+
+# plates go into recorded_plates (and stop a track's OCR) only after their violations are committed
+def mark_recorded(read_tracks, recorded_plates, now):
+    for track, plate_number in read_tracks:
+        track["plate"] = plate_number
+        recorded_plates[plate_number] = now
+
+
+def ingest_video(source, stride=5, location="Auto-Detected via Video", max_ocr_attempts=5,
+                 iou_threshold=0.3, max_age=10, dry_run=False, plate_ttl=VIDEO_PLATE_TTL):
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video source: {source}")
+    # plates expire on the video's own clock, a clip is processed faster than it plays
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    started = time.monotonic()
+
+    pool = None if dry_run else ConnectionPool(size=1)
+    tracker = RiderTracker(iou_threshold=iou_threshold, max_age=max_age)
+    recorded_plates = {}  # plate -> video time it was last filed at, only plates that are committed
+    stats = {"frames": 0, "sampled": 0, "riders": 0, "ocr_runs": 0, "violations": 0, "duplicates": 0}
+
+    frame_idx = -1
+    try:
+        while True:
+            # grab() skips decoding, only the sampled frames get retrieve()'d
+            if not cap.grab():
+                break
+            frame_idx += 1
+            stats["frames"] += 1
+            if frame_idx % stride:
+                continue
+
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            stats["sampled"] += 1
+            sample_no = frame_idx // stride
+            now = frame_idx / fps if fps > 0 else time.monotonic() - started
+
+            boxes = detect_helmet_violations(frame)
+
+            # riders whose plate we still need, already read or given up ones are skipped
+            pending = [t for t in tracker.update(boxes, sample_no)
+                       if not t["plate"] and t["ocr_attempts"] < max_ocr_attempts]
+            if not pending:
+                continue
+
+            for track in pending:
+                track["ocr_attempts"] += 1
+            stats["ocr_runs"] += 1
+
+            # one plate model + one OCR call for every pending rider in the frame, the boxes are drawn on the copy
+            annotated_img = frame.copy()
+            records = read_plates_in_frame(frame, [t["box"] for t in pending], annotated_img)
+
+            for plate_number in [p for p, filed_at in recorded_plates.items() if now - filed_at > plate_ttl]:
+                del recorded_plates[plate_number]
+
+            new_plates = []
+            read_tracks = []  # (track, plate) marked as read once their violations are saved
+            for track, (violation_type, plate_number, box) in zip(pending, records):
+                if not plate_number:
+                    continue
+
+                # same plate picked up again by a new track (rider left and came back into view, or a pillion rider)
+                if plate_number in recorded_plates:
+                    track["plate"] = plate_number
+                    stats["duplicates"] += 1
+                    continue
+                read_tracks.append((track, plate_number))
+                if any(plate_number == p for _, p in new_plates):
+                    stats["duplicates"] += 1
+                    continue
+                new_plates.append((violation_type, plate_number))
+                print(f"[frame {frame_idx}] rider #{track['id']} -> {plate_number}")
+
+            if not new_plates:
+                continue
+            if dry_run:
+                mark_recorded(read_tracks, recorded_plates, now)
+                stats["violations"] += len(new_plates)
+                continue
+
+            evidence_filename = save_evidence_image(annotated_img, "frame.jpg")
+            db = pool.get_connection()
+            try:
+                cursor = db.cursor()
+                for violation_type, plate_number in new_plates:
+                    record_auto_violation(cursor, violation_type, plate_number, evidence_filename, location=location)
+                db.commit()
+                cursor.close()
+                mark_recorded(read_tracks, recorded_plates, now)
+                stats["violations"] += len(new_plates)
+            except Exception as e:
+                # the riders stay pending, their plates are read and filed again on a later frame
+                print(f"Error saving violations {new_plates}: {e}")
+                db.rollback()
+            finally:
+                db.close()
+    finally:
+        cap.release()
+        if pool:
+            pool.close_all()
+
+    stats["riders"] = tracker._next_id - 1
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Detect helmet violations in a video file or stream")
+    parser.add_argument("source", help="video file path, stream URL or camera index")
+    parser.add_argument("--stride", type=int, default=5, help="run detection on every Nth frame")
+    parser.add_argument("--location", default="Auto-Detected via Video")
+    parser.add_argument("--max-ocr-attempts", type=int, default=5, help="frames to try reading a riders plate before giving up")
+    parser.add_argument("--iou", type=float, default=0.3, help="min box overlap to treat two detections as the same rider")
+    parser.add_argument("--max-age", type=int, default=10, help="sampled frames a rider can be missing before the track is dropped")
+    parser.add_argument("--plate-ttl", type=float, default=VIDEO_PLATE_TTL,
+                        help="seconds of video before a plate that was filed can be filed again")
+    parser.add_argument("--dry-run", action="store_true", help="print violations without saving anything")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    stats = ingest_video(source, stride=max(1, args.stride), location=args.location,
+                         max_ocr_attempts=args.max_ocr_attempts, iou_threshold=args.iou,
+                         max_age=args.max_age, dry_run=args.dry_run, plate_ttl=args.plate_ttl)
+    print(f"Done: {stats}")
@@ -0,0 +1,212 @@
+import atexit
+import os
+import threading
+import time
+import mysql.connector
+from metrics import VIOLATION_FLUSH
+from violation_store import record_violation_group
+from vehicle_registry import registry
+import read_cache
+
+
+# Write-behind buffer for violation inserts (VIOLATION_WRITE_MODE=buffered).
+# The ingestion routes append records here and a background flusher writes them in groups,
+# one transaction (and one commit / fsync) per group instead of one per reading.
+# A group is flushed when it reaches VIOLATION_FLUSH_SIZE records or its oldest record
+# has waited VIOLATION_FLUSH_INTERVAL seconds.
+#
+# VIOLATION_DURABILITY
+#   commit  add() returns once the group holding the record is committed, callers still share commits
+#   async   add() returns as soon as the record is buffered, records not flushed yet are lost if the
+#           process dies without draining (a normal shutdown drains the buffer)
+
+VIOLATION_WRITE_MODE = os.environ.get("VIOLATION_WRITE_MODE", "direct")
+VIOLATION_FLUSH_SIZE = int(os.environ.get("VIOLATION_FLUSH_SIZE", 200))
+VIOLATION_FLUSH_INTERVAL = float(os.environ.get("VIOLATION_FLUSH_INTERVAL", 0.05))
+VIOLATION_BUFFER_DEPTH = int(os.environ.get("VIOLATION_BUFFER_DEPTH", 10000))
+VIOLATION_DURABILITY = os.environ.get("VIOLATION_DURABILITY", "commit")
+
+
+class BufferFull(Exception):
+    pass
+
+
+# failed maps the position of every record of the add() call that was not written to its error,
+# the other records of that call are committed
+class FlushFailed(Exception):
+
+    def __init__(self, message, failed=None):
+        super().__init__(message)
+        self.failed = failed or {}
+
+
+class _Pending:
+
+    def __init__(self, records):
+        self.records = records
+        self.remaining = len(records)
+        self.errors = {}  # record position -> error
+        self.done = threading.Event()
+
+
+class ViolationBuffer:
+
+    def __init__(self, pool, flush_size=VIOLATION_FLUSH_SIZE, flush_interval=VIOLATION_FLUSH_INTERVAL,
+                 max_depth=VIOLATION_BUFFER_DEPTH, durability=VIOLATION_DURABILITY, name="violations"):
+        if durability not in ("commit", "async"):
+            raise ValueError(f"Unknown VIOLATION_DURABILITY: {durability} (expected commit or async)")
+        self.pool = pool
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.durability = durability
+        self.name = name
+        self._items = []  # (record, pending, enqueued at)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.stats = {"enqueued": 0, "flushed": 0, "failed": 0, "rejected": 0, "flushes": 0,
+                      "flush_ms_total": 0.0, "flush_ms_max": 0.0, "last_flush_ms": 0.0}
+
+    # flusher is started on first add so importing the app stays cheap
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flusher, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()
+
+    # buffer the records of one request, raises BufferFull when the buffer is at max_depth
+    # with commit durability this waits for the flush and raises FlushFailed if it did not go through
+    def add(self, records):
+        if not records:
+            return
+        pending = _Pending(records)
+        now = time.monotonic()
+        with self._cond:
+            if self._stopping:
+                raise BufferFull(f"{self.name} buffer is shutting down")
+            if len(self._items) + len(records) > self.max_depth:
+                self.stats["rejected"] += len(records)
+                raise BufferFull(f"{self.name} buffer is full ({len(self._items)} records waiting)")
+            self._start()
+            self._items.extend((record, pending, now, position) for position, record in enumerate(records))
+            self.stats["enqueued"] += len(records)
+            self._cond.notify()
+
+        if self.durability == "commit":
+            pending.done.wait()
+            if pending.errors:
+                first = pending.errors[min(pending.errors)]
+                raise FlushFailed(f"{len(pending.errors)} of {len(records)} violations could not be written: {first}", pending.errors)
+
+    def depth(self):
+        with self._cond:
+            return len(self._items)
+
+    def _flusher(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._items and (self._stopping or len(self._items) >= self.flush_size
+                                        or time.monotonic() - self._items[0][2] >= self.flush_interval):
+                        break
+                    if self._stopping:
+                        return
+                    timeout = None
+                    if self._items:
+                        timeout = max(0.0, self._items[0][2] + self.flush_interval - time.monotonic())
+                    self._cond.wait(timeout)
+                group = self._items[:self.flush_size]
+                del self._items[:self.flush_size]
+            self._flush(group)
+
+    def _flush(self, group):
+        started = time.perf_counter()
+        records = [record for record, _, _, _ in group]
+        failed = {}
+        try:
+            self._write(records)
+        except Exception as e:
+            # write what we can one record at a time so one bad record doesnt drop the group
+            print(f"Error flushing {len(records)} buffered violations, retrying one by one: {e}")
+            for i, record in enumerate(records):
+                try:
+                    self._write([record])
+                except Exception as e:
+                    print(f"Dropped buffered violation for {record['plate']}: {e}")
+                    failed[i] = str(e)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        VIOLATION_FLUSH.observe(elapsed_ms / 1000)
+        with self._cond:
+            self.stats["flushes"] += 1
+            self.stats["flushed"] += len(records) - len(failed)
+            self.stats["failed"] += len(failed)
+            self.stats["flush_ms_total"] += elapsed_ms
+            self.stats["flush_ms_max"] = max(self.stats["flush_ms_max"], elapsed_ms)
+            self.stats["last_flush_ms"] = elapsed_ms
+
+        for i, (record, pending, _, position) in enumerate(group):
+            if i in failed:
+                pending.errors[position] = failed[i]
+            pending.remaining -= 1
+            if pending.remaining == 0:
+                pending.done.set()
+
+    def _write(self, records):
+        db = self.pool.get_connection()
+        try:
+            cursor = db.cursor()
+            try:
+                record_violation_group(cursor, records)
+            except mysql.connector.IntegrityError:
+                # a cached vehicle may have been deleted, look the plates up again
+                db.rollback()
+                for record in records:
+                    registry.forget(record["plate"])
+                record_violation_group(cursor, records)
+            db.commit()
+            cursor.close()
+            read_cache.violations_added([(record["plate"], record["reported_by"]) for record in records])
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # flush everything still buffered and stop the flusher, called on shutdown
+    def drain(self, timeout=30):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+            left = len(self._items)
+        if thread is None:
+            return
+        if left:
+            print(f"Draining {left} buffered violations...")
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f"{self.name} buffer did not drain within {timeout}s, {self.depth()} records lost")
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["depth"] = len(self._items)
+        stats["max_depth"] = self.max_depth
+        stats["durability"] = self.durability
+        stats["avg_flush_ms"] = round(stats["flush_ms_total"] / stats["flushes"], 2) if stats["flushes"] else 0.0
+        stats["avg_group_size"] = round((stats["flushed"] + stats["failed"]) / stats["flushes"], 2) if stats["flushes"] else 0.0
+        for key in ("flush_ms_total", "flush_ms_max", "last_flush_ms"):
+            stats[key] = round(stats[key], 2)
+        return stats
+
+
+# the buffer for this process, or None when violations are written directly
+def create_buffer(pool):
+    if VIOLATION_WRITE_MODE == "direct":
+        return None
+    if VIOLATION_WRITE_MODE != "buffered":
+        raise ValueError(f"Unknown VIOLATION_WRITE_MODE: {VIOLATION_WRITE_MODE} (expected direct or buffered)")
+    buffer = ViolationBuffer(pool)
+    atexit.register(buffer.drain)
+    return buffer
@@ -0,0 +1,101 @@
+from datetime import datetime
+import mysql.connector
+import dashboard_stats
+from vehicle_registry import registry
+
+
+# database writes for violations coming from the cameras and the IoT devices,
+# shared by the app and the ingestion scripts
+
+MISSING_PARENT_ROW = 1452
+# InnoDB rolled the transaction back to break a lock cycle, running it again is safe
+DEADLOCK = 1213
+
+
+# find or auto register the vehicle and insert the violation, the caller commits
+def record_auto_violation(cursor, violation_type, plate_number, evidence_filename=None, location="Auto-Detected via Camera",
+                          fine_amount=500, vehicle_type="Motorcycle", reported_by=None):
+    vehicle_id = registry.resolve(cursor, plate_number, vehicle_type)
+
+    query = "INSERT INTO Violations (VehicleID, ViolationType, FineAmount, Location, evidence_image, ReportedBy) VALUES (%s, %s, %s, %s, %s, %s)"
+    try:
+        cursor.execute(query, (vehicle_id, violation_type, fine_amount, location, evidence_filename, reported_by))
+    except mysql.connector.IntegrityError as e:
+        if e.errno != MISSING_PARENT_ROW:
+            raise
+        # the cached vehicle was deleted (or its registration rolled back), look it up again
+        registry.forget(plate_number)
+        vehicle_id = registry.resolve(cursor, plate_number, vehicle_type)
+        cursor.execute(query, (vehicle_id, violation_type, fine_amount, location, evidence_filename, reported_by))
+    dashboard_stats.record_violation_added(cursor, violation_type, fine_amount)
+    return vehicle_id
+
+
+# violation ids already stored for these idempotency keys of one device, {key: ViolationID}
+def find_idempotent_violations(cursor, reported_by, keys):
+    if not keys:
+        return {}
+    placeholders = ", ".join(["%s"] * len(keys))
+    cursor.execute(f"SELECT IdempotencyKey, ViolationID FROM Violations WHERE ReportedBy = %s AND IdempotencyKey IN ({placeholders})",
+                   [reported_by] + list(keys))
+    return dict(cursor.fetchall())
+
+
+# insert a batch of readings from one device, readings are dicts with key, plate, fine and time
+# readings whose key is already stored are skipped, returns {key: (ViolationID, created)}
+# the caller commits, a duplicate key error means a concurrent retry of the same batch got in first
+def record_device_violations(cursor, reported_by, violation_type, readings, location, vehicle_type="UNKNOWN"):
+    existing = find_idempotent_violations(cursor, reported_by, [r["key"] for r in readings])
+    new = [r for r in readings if r["key"] not in existing]
+    if not new:
+        return {key: (violation_id, False) for key, violation_id in existing.items()}
+
+    vehicle_ids = registry.resolve_many(cursor, [r["plate"] for r in new], vehicle_type)
+
+    rows = []
+    for r in new:
+        rows.extend([vehicle_ids[r["plate"]], r["time"], violation_type, r["fine"], location, reported_by, r["key"]])
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(new))
+    cursor.execute(f"""
+        INSERT INTO Violations (VehicleID, DateTime, ViolationType, FineAmount, Location, ReportedBy, IdempotencyKey)
+        VALUES {placeholders}
+    """, rows)
+    dashboard_stats.record_violation_added(cursor, violation_type, sum(r["fine"] for r in new), count=len(new))
+
+    created = find_idempotent_violations(cursor, reported_by, [r["key"] for r in new])
+    results = {key: (violation_id, False) for key, violation_id in existing.items()}
+    results.update({key: (violation_id, True) for key, violation_id in created.items()})
+    return results
+
+
+# a violation to write later with record_violation_group, same defaults as record_auto_violation
+# the time is taken now so a delayed write keeps the time the violation was seen
+def violation_record(violation_type, plate_number, evidence_filename=None, location="Auto-Detected via Camera",
+                     fine_amount=500, vehicle_type="Motorcycle", reported_by=None, when=None):
+    return {"violation_type": violation_type, "plate": plate_number, "evidence": evidence_filename, "location": location,
+            "fine": fine_amount, "vehicle_type": vehicle_type, "reported_by": reported_by, "time": when or datetime.now()}
+
+
+# write many violation records with one plate lookup and one multi-row INSERT, the caller commits
+# a plate seen with several vehicle types is registered with the first one
+def record_violation_group(cursor, records):
+    vehicle_types = {}
+    for r in records:
+        vehicle_types.setdefault(r["plate"], r["vehicle_type"])
+    vehicle_ids = registry.resolve_many(cursor, list(vehicle_types), vehicle_types=vehicle_types)
+
+    rows = []
+    for r in records:
+        rows.extend([vehicle_ids[r["plate"]], r["time"], r["violation_type"], r["fine"], r["location"], r["evidence"], r["reported_by"]])
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(records))
+    cursor.execute(f"""
+        INSERT INTO Violations (VehicleID, DateTime, ViolationType, FineAmount, Location, evidence_image, ReportedBy)
+        VALUES {placeholders}
+    """, rows)
+
+    totals = {}
+    for r in records:
+        count, fines = totals.get(r["violation_type"], (0, 0))
+        totals[r["violation_type"]] = (count + 1, fines + r["fine"])
+    for violation_type, (count, fines) in totals.items():
+        dashboard_stats.record_violation_added(cursor, violation_type, fines, count=count)